@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Compare matching usage lines when every alternative is tried, as docopt
+used to, with stopping at the first one that matches all of the arguments.
+
+Usage:
+  alternatives.py [--lines=<n>] [--parses=<n>] [--repeat=<n>]
+
+Options:
+  --lines=<n>   Number of generated usage lines [default: 50] [type: int]
+  --parses=<n>  Number of parsed argument vectors [default: 2000] [type: int]
+  --repeat=<n>  Number of timed runs, the best is reported [default: 3]
+                [type: int]
+"""
+
+import random
+import timeit
+
+import docopt
+from docopt import Parser
+
+
+def generate_docstring(n_lines: int) -> str:
+    usages = "".join(
+        f"  tool cmd{i} <service> [--region=<r>] [--force]\n" for i in range(n_lines)
+    )
+    return (
+        f"Usage:\n{usages}\nOptions:\n"
+        "  --region=<r>  Region [default: eu].\n"
+        "  --force       Skip the checks.\n"
+    )
+
+
+def generate_argvs(n_lines: int, n_parses: int) -> list:
+    r = random.Random(0)
+    return [
+        [f"cmd{r.randrange(n_lines)}", f"svc{r.randrange(1000)}", "--force"]
+        for _ in range(n_parses)
+    ]
+
+
+def match_every_alternative(self, left, collected=None):
+    collected = [] if collected is None else collected
+    outcomes = []
+    for pattern in self.children:
+        matched, _, _ = outcome = pattern.match(left, collected)
+        if matched:
+            outcomes.append(outcome)
+    if outcomes:
+        return min(outcomes, key=lambda outcome: len(outcome[1]))
+    return False, left, collected
+
+
+if __name__ == "__main__":
+    arguments = docopt.docopt(__doc__)
+    repeat = arguments["--repeat"]
+    parser = Parser(generate_docstring(arguments["--lines"]))
+    argvs = generate_argvs(arguments["--lines"], arguments["--parses"])
+    early_exit = docopt._Either.match
+    for label, match in [("every", match_every_alternative), ("early", early_exit)]:
+        docopt._Either.match = match
+        runs = timeit.repeat(
+            lambda: [parser.parse(argv) for argv in argvs], number=1, repeat=repeat
+        )
+        print(f"{label:<10} {min(runs) * 1e3:10.2f} ms")
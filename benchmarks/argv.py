@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Time parsing a very long argument vector.
+
+Usage:
+  argv.py [--tokens=<n>] [--repeat=<n>]
+
+Options:
+  --tokens=<n>  Number of tokens in the argument vector [default: 1000000]
+                [type: int]
+  --repeat=<n>  Number of timed runs, the best is reported [default: 3]
+                [type: int]
+"""
+
+import timeit
+
+from docopt import Parser
+from docopt import docopt
+
+DOC = """Usage: prog [options] <file>...
+
+Options:
+  -v, --verbose    Be verbose.
+  -n N, --number=N  A number.
+  --name=NAME      A name.
+"""
+
+
+def generate_argv(n_tokens: int) -> list:
+    # Options, then positional arguments mixed with negative numbers and "-".
+    pattern = ["file.txt", "-1", "other.txt", "-", "-2.5"]
+    return ["-v", "--name=x", "-n", "3"] + [
+        pattern[i % len(pattern)] for i in range(n_tokens - 4)
+    ]
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    parser = Parser(DOC)
+    argv = generate_argv(arguments["--tokens"])
+    runs = timeit.repeat(
+        lambda: parser.parse(argv), number=1, repeat=arguments["--repeat"]
+    )
+    best = min(runs)
+    print(f"{len(argv)} tokens {best:8.2f} s {best / len(argv) * 1e9:8.0f} ns/token")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Compare parsing a replayed log of argument vectors one at a time with
+`Parser.parse_many`, which matches each shape of argument vector only once.
+
+Usage:
+  batch.py [--lines=<n>] [--parses=<n>] [--repeat=<n>]
+
+Options:
+  --lines=<n>   Number of generated usage lines [default: 50] [type: int]
+  --parses=<n>  Number of parsed argument vectors [default: 20000] [type: int]
+  --repeat=<n>  Number of timed runs, the best is reported [default: 3]
+                [type: int]
+"""
+
+import random
+import timeit
+
+from docopt import Parser
+from docopt import docopt
+
+
+def generate_docstring(n_lines: int) -> str:
+    usages = "".join(
+        f"  tool cmd{i} <service> [--region=<r>] [--force] [<tag>...]\n"
+        for i in range(n_lines)
+    )
+    return (
+        f"Usage:\n{usages}\nOptions:\n"
+        "  --region=<r>  Region [default: eu].\n"
+        "  --force       Skip the checks.\n"
+    )
+
+
+def generate_argvs(n_lines: int, n_parses: int) -> list:
+    r = random.Random(0)
+    return [
+        [f"cmd{r.randrange(n_lines)}", f"svc{r.randrange(1000)}"]
+        + ([f"--region=r{r.randrange(5)}"] if r.random() < 0.5 else [])
+        + [f"t{j}" for j in range(r.randrange(3))]
+        for _ in range(n_parses)
+    ]
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    repeat = arguments["--repeat"]
+    parser = Parser(generate_docstring(arguments["--lines"]))
+    argvs = generate_argvs(arguments["--lines"], arguments["--parses"])
+    assert parser.parse_many(argvs) == [parser.parse(argv) for argv in argvs]
+    for label, run in [
+        ("parse", lambda: [parser.parse(argv) for argv in argvs]),
+        ("parse_many", lambda: parser.parse_many(argvs)),
+    ]:
+        runs = timeit.repeat(run, number=1, repeat=repeat)
+        print(f"{label:<10} {min(runs) * 1e3:10.2f} ms")
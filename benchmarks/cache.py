@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Compare parsing a replayed stream of argument vectors, in which a few
+distinct ones repeat, with and without the result cache of `Parser`.
+
+Usage:
+  cache.py [--parses=<n>] [--distinct=<n>] [--cache-size=<n>] [--repeat=<n>]
+
+Options:
+  --parses=<n>      Number of parsed argument vectors [default: 20000]
+                    [type: int]
+  --distinct=<n>    Number of distinct argument vectors [default: 50]
+                    [type: int]
+  --cache-size=<n>  Number of cached results [default: 128] [type: int]
+  --repeat=<n>      Number of timed runs, the best is reported [default: 3]
+                    [type: int]
+"""
+
+import random
+import timeit
+
+from docopt import Parser
+from docopt import docopt
+
+DOC = """Usage:
+  bot deploy <service> [--region=<r>] [--force]
+  bot rollback <service> [--to=<version>]
+  bot status [<service>...] [-v...]
+
+Options:
+  --region=<r>    Region [default: eu].
+  --force         Skip the checks.
+  --to=<version>  Version to roll back to.
+  -v              Be verbose.
+"""
+
+
+def generate_argvs(n_parses: int, n_distinct: int) -> list:
+    distinct = [
+        [
+            ["deploy", f"svc{i}", f"--region=r{i % 3}"],
+            ["rollback", f"svc{i}", f"--to={i}"],
+            ["status", f"svc{i}", "-vv"],
+        ][i % 3]
+        for i in range(n_distinct)
+    ]
+    # A few commands are much more frequent than the others.
+    weights = [1 / (rank + 1) for rank in range(n_distinct)]
+    return random.Random(0).choices(distinct, weights, k=n_parses)
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    repeat = arguments["--repeat"]
+    argvs = generate_argvs(arguments["--parses"], arguments["--distinct"])
+    for label, cache_size in [("uncached", 0), ("cached", arguments["--cache-size"])]:
+        parser = Parser(DOC, cache_size=cache_size)
+        runs = timeit.repeat(
+            lambda: [parser.parse(argv) for argv in argvs], number=1, repeat=repeat
+        )
+        print(f"{label:<10} {min(runs) * 1e3:10.2f} ms")
+    info = parser.cache_info()
+    print(
+        f"hit rate {info.hits / (info.hits + info.misses):.1%}, "
+        f"{info.currsize} results in {info.nbytes / 1e3:.0f} kB"
+    )
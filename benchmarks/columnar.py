@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Compare the memory and time of the results of `Parser.parse_many` as a
+list of `ParsedOptions` and as `ParsedColumns`.
+
+Usage:
+  columnar.py [--parses=<n>]
+
+Options:
+  --parses=<n>  Number of parsed argument vectors [default: 100000] [type: int]
+"""
+
+import random
+import time
+import tracemalloc
+
+from docopt import Parser
+from docopt import docopt
+
+DOC = """Usage:
+  tool deploy <service> [--region=<r>] [--replicas=<n>] [-v...] [--force]
+  tool rollback <service> [--to=<version>] [-v...]
+  tool status [<service>...]
+
+Options:
+  --region=<r>    Region [default: eu].
+  --replicas=<n>  Number of replicas [type: int]
+  --to=<version>  Version to roll back to.
+  -v              Be more verbose.
+  --force         Skip the checks.
+"""
+
+
+def generate_argvs(n_parses: int) -> list:
+    r = random.Random(0)
+    argvs = []
+    for _ in range(n_parses):
+        service = f"svc{r.randrange(1000)}"
+        argvs.append(
+            r.choice(
+                [
+                    ["deploy", service, f"--region=r{r.randrange(5)}", "-vv"],
+                    ["deploy", service, "--replicas", str(r.randrange(9)), "--force"],
+                    ["rollback", service, f"--to=v{r.randrange(99)}"],
+                    ["status", service, f"svc{r.randrange(1000)}"],
+                ]
+            )
+        )
+    return argvs
+
+
+def measure(label: str, function, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<10} {elapsed * 1e3:10.2f} ms  "
+        f"{current / len(args[0]):8.1f} bytes per argument vector"
+    )
+    return result
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    argvs = generate_argvs(arguments["--parses"])
+    parser = Parser(DOC)
+    parser.parse_many(argvs[:1000], columnar=True)
+    measure("rows", parser.parse_many, argvs)
+    columns = measure("columnar", parser.parse_many, argvs, columnar=True)
+    print(f"columns are {type(columns['--region'].starts).__module__} arrays")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Compare the time to parse argument vectors with the deterministic matcher
+and with the general one, for a grammar the deterministic one can match.
+
+Usage:
+  deterministic.py [--groups=<n>] [--parses=<n>] [--repeat=<n>]
+
+Options:
+  --groups=<n>  Number of generated command groups [default: 20] [type: int]
+  --parses=<n>  Number of parsed argument vectors [default: 5000] [type: int]
+  --repeat=<n>  Number of timed runs, the best is reported [default: 3]
+                [type: int]
+"""
+
+import random
+import timeit
+
+import docopt
+from docopt import Parser
+
+SUBCOMMANDS = [
+    "add [--fetch] <name> <url>",
+    "rename <old> <new>",
+    "remove <name>",
+    "set-url [--push] <name> <url>",
+    "show [-v...] [<name>...]",
+    "prune [--dry-run] <name>",
+    "format (--json | --yaml) <name>",
+]
+
+
+def generate_docstring(n_groups: int) -> str:
+    usages = "".join(
+        f"  tool group{i} [--quiet] {subcommand}\n"
+        for i in range(n_groups)
+        for subcommand in SUBCOMMANDS
+    )
+    return (
+        f"Usage:\n{usages}  tool (-h | --help)\n  tool --version\n\n"
+        "Options:\n"
+        "  --quiet    Print less.\n"
+        "  --fetch    Fetch after adding.\n"
+        "  --push     Set the push URL.\n"
+        "  -v         Show more.\n"
+        "  --dry-run  Only show what would be pruned.\n"
+        "  --json     Write JSON.\n"
+        "  --yaml     Write YAML.\n"
+    )
+
+
+def generate_argvs(n_groups: int, n_parses: int) -> list:
+    r = random.Random(0)
+    return [
+        [f"group{r.randrange(n_groups)}", "--quiet"]
+        + r.choice(
+            [
+                ["add", "--fetch", "origin", "url"],
+                ["rename", "a", "b"],
+                ["remove", "origin"],
+                ["set-url", "origin", "url", "--push"],
+                ["show", "-vv", "a", "b", "c"],
+                ["prune", "--dry-run", "origin"],
+                ["format", "--yaml", "origin"],
+            ]
+        )
+        for _ in range(n_parses)
+    ]
+
+
+if __name__ == "__main__":
+    arguments = docopt.docopt(__doc__)
+    repeat = arguments["--repeat"]
+    doc = generate_docstring(arguments["--groups"])
+    argvs = generate_argvs(arguments["--groups"], arguments["--parses"])
+    general = Parser(doc, version="1.0")
+    general._engine = "general"
+    deterministic = Parser(doc, version="1.0")
+    assert deterministic.engine == "deterministic"
+    assert [general.parse(argv) for argv in argvs] == [
+        deterministic.parse(argv) for argv in argvs
+    ]
+    for parser in [general, deterministic]:
+        runs = timeit.repeat(
+            lambda: [parser.parse(argv) for argv in argvs], number=1, repeat=repeat
+        )
+        print(f"{parser.engine:<14} {min(runs) * 1e3:10.2f} ms")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Compare matching argument vectors against every usage line with only
+trying the lines their first positional argument can start.
+
+Usage:
+  dispatch.py [--lines=<n>] [--parses=<n>] [--repeat=<n>]
+
+Options:
+  --lines=<n>   Number of generated usage lines [default: 500] [type: int]
+  --parses=<n>  Number of parsed argument vectors [default: 2000] [type: int]
+  --repeat=<n>  Number of timed runs, the best is reported [default: 3]
+                [type: int]
+"""
+
+import random
+import timeit
+
+from docopt import Parser
+from docopt import docopt
+
+TEMPLATES = [
+    "  tool ship{i} new <name>...\n",
+    "  tool ship{i} <name> move <x> <y> [--speed=<kn>]\n",
+    "  tool mine{i} (set|remove) <x> <y> [--moored|--drifting]\n",
+]
+
+
+def generate_docstring(n_lines: int) -> str:
+    usages = "".join(TEMPLATES[i % 3].format(i=i // 3) for i in range(n_lines))
+    return (
+        f"Usage:\n{usages}\nOptions:\n"
+        "  --speed=<kn>  Speed in knots [default: 10].\n"
+        "  --moored      Moored (anchored) mine.\n"
+        "  --drifting    Drifting mine.\n"
+    )
+
+
+def generate_argvs(n_lines: int, n_parses: int) -> list:
+    r = random.Random(0)
+    argvs = []
+    for _ in range(n_parses):
+        line = r.randrange(n_lines)
+        i = line // 3
+        argvs.append(
+            [
+                [f"ship{i}", "new", "a", "b"],
+                [f"ship{i}", "titanic", "move", "1", "2", "--speed=9"],
+                [f"mine{i}", "set", "1", "2", "--moored"],
+            ][line % 3]
+        )
+    return argvs
+
+
+class WholePatternParser(Parser):
+    """Matches every usage line, as docopt did before the index."""
+
+    def _match_values(self, parsed):
+        matched, left, collected = self._pattern.match(parsed)
+        if matched and not left:
+            return {a.name: a.value for a in collected}
+        return None
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    repeat = arguments["--repeat"]
+    doc = generate_docstring(arguments["--lines"])
+    argvs = generate_argvs(arguments["--lines"], arguments["--parses"])
+    for label, parser in [("whole", WholePatternParser(doc)), ("indexed", Parser(doc))]:
+        runs = timeit.repeat(
+            lambda: [parser.parse(argv) for argv in argvs], number=1, repeat=repeat
+        )
+        print(f"{label:<10} {min(runs) * 1e3:10.2f} ms")
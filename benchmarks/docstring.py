@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Time splitting and linting a very long docstring into its sections.
+
+Usage:
+  docstring.py [--lines=<n>] [--repeat=<n>]
+
+Options:
+  --lines=<n>   Number of lines in the generated docstring [default: 100000]
+                [type: int]
+  --repeat=<n>  Number of timed runs, the best is reported [default: 5]
+                [type: int]
+"""
+
+import timeit
+
+from docopt import _lint_docstring
+from docopt import _scan_docstring
+from docopt import docopt
+
+
+def generate_docstrings(n_lines: int) -> dict:
+    prose = "".join(f"Words about the program, line {i}.\n" for i in range(n_lines))
+    usage = "".join(f"  prog cmd{i} <file>...\n" for i in range(n_lines))
+    return {
+        "long preamble": f"{prose}\nUsage: prog [options]\n\nOptions:\n  -v\n",
+        "long usage": f"Usage:\n{usage}\nOptions:\n  -v  Be verbose.\n",
+        "long epilogue": f"Usage: prog [options]\n\n{prose}",
+    }
+
+
+def split_and_lint(docstring: str):
+    sections, findings = _scan_docstring(docstring)
+    _lint_docstring(sections, findings)
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    for label, docstring in generate_docstrings(arguments["--lines"]).items():
+        runs = timeit.repeat(
+            lambda: split_and_lint(docstring), number=1, repeat=arguments["--repeat"]
+        )
+        print(f"{label:<14} {min(runs) * 1e3:10.2f} ms")
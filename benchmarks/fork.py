@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Measure the memory forked workers copy from a parser compiled before the
+fork, with and without `Parser.freeze()` and `gc.freeze()`. Linux only.
+
+Usage:
+  fork.py [--options=<n>] [--commands=<n>] [--parses=<n>]
+
+Options:
+  --options=<n>   Number of generated options [default: 3000] [type: int]
+  --commands=<n>  Number of generated commands [default: 3000] [type: int]
+  --parses=<n>    Number of argument vectors each worker parses [default: 20]
+                  [type: int]
+"""
+
+import gc
+import os
+
+from docopt import Parser
+from docopt import docopt
+
+
+def generate_docstring(n_options: int, n_commands: int) -> str:
+    usages = "".join(
+        f"  prog cmd{i} [--opt{i % n_options}=<v>] <file>...\n"
+        for i in range(n_commands)
+    )
+    options = "".join(
+        f"  --opt{i}=<v>  Option {i} [default: {i}].\n" for i in range(n_options)
+    )
+    return f"Usage:\n{usages}\nOptions:\n{options}"
+
+
+def memory() -> dict:
+    with open("/proc/self/smaps_rollup") as f:
+        fields = (line.split() for line in f if line.split()[-1:] == ["kB"])
+        return {name.rstrip(":"): int(value) for name, value, _ in fields}
+
+
+def private(fields: dict) -> int:
+    return fields["Private_Clean"] + fields["Private_Dirty"]
+
+
+def worker_growth(parser: Parser, argvs: list) -> int:
+    """The kB of memory a forked worker copies to parse `argvs`."""
+    read, write = os.pipe()
+    if os.fork() == 0:
+        before = private(memory())
+        for argv in argvs:
+            parser.parse(argv)
+        gc.collect()
+        os.write(write, str(private(memory()) - before).encode())
+        os._exit(0)
+    os.close(write)
+    os.wait()
+    with os.fdopen(read) as f:
+        return int(f.read())
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    n_options, n_commands = arguments["--options"], arguments["--commands"]
+    before = memory()["Rss"]
+    parser = Parser(generate_docstring(n_options, n_commands))
+    print(f"{'grammar':<10} {memory()['Rss'] - before:10d} kB")
+    argvs = [
+        [f"cmd{i}", f"--opt{i % n_options}=x", "a", "b"]
+        for i in range(0, n_commands, max(1, n_commands // arguments["--parses"]))
+    ]
+    print(f"{'unfrozen':<10} {worker_growth(parser, argvs):10d} kB")
+    parser.freeze()
+    gc.freeze()
+    print(f"{'frozen':<10} {worker_growth(parser, argvs):10d} kB")
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Compare compiling a generated interface from a Grammar and from its
+rendered docstring.
+
+Usage:
+  grammar.py [--options=<n>] [--commands=<n>] [--repeat=<n>]
+
+Options:
+  --options=<n>   Number of generated options [default: 2000] [type: int]
+  --commands=<n>  Number of generated commands [default: 2000] [type: int]
+  --repeat=<n>    Number of timed runs, the best is reported [default: 3]
+                  [type: int]
+"""
+
+import timeit
+
+from docopt import Grammar
+from docopt import Parser
+from docopt import docopt
+
+
+def generate_grammar(n_options: int, n_commands: int) -> Grammar:
+    grammar = Grammar("prog")
+    grammar.options(
+        (None, f"--opt{i}", 1, str(i), f"Option {i}.") for i in range(n_options)
+    )
+    grammar.usages(
+        (f"cmd{i}", Grammar.optional(f"--opt{i % n_options}=<v>"), "<file>...")
+        for i in range(n_commands)
+    )
+    return grammar
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    repeat = arguments["--repeat"]
+    grammar = generate_grammar(arguments["--options"], arguments["--commands"])
+    docstring = grammar.render()
+    for label, source in [("docstring", docstring), ("grammar", grammar)]:
+        runs = timeit.repeat(lambda: Parser(source), number=1, repeat=repeat)
+        print(f"{label:<10} {min(runs) * 1e3:10.2f} ms")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Compare compiling a generated interface from its docstring with loading it
+from the intermediate representation `Parser.to_ir` returns.
+
+Usage:
+  ir.py [--options=<n>] [--commands=<n>] [--repeat=<n>]
+
+Options:
+  --options=<n>   Number of generated options [default: 2000] [type: int]
+  --commands=<n>  Number of generated commands [default: 2000] [type: int]
+  --repeat=<n>    Number of timed runs, the best is reported [default: 3]
+                  [type: int]
+"""
+
+import json
+import timeit
+
+from docopt import Parser
+from docopt import docopt
+
+
+def generate_docstring(n_options: int, n_commands: int) -> str:
+    usages = "".join(
+        f"  prog cmd{i} [--opt{i % n_options}=<v>] <file>...\n"
+        for i in range(n_commands)
+    )
+    options = "".join(
+        f"  --opt{i}=<v>  Option {i} [default: {i}].\n" for i in range(n_options)
+    )
+    return f"Usage:\n{usages}\nOptions:\n{options}"
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    repeat = arguments["--repeat"]
+    docstring = generate_docstring(arguments["--options"], arguments["--commands"])
+    ir = Parser(docstring).to_ir()
+    text = json.dumps(ir)
+    print(f"IR is {len(text) / 1e3:.0f} kB of JSON")
+    for label, build in [
+        ("docstring", lambda: Parser(docstring)),
+        ("IR text", lambda: Parser.from_ir(text)),
+        ("IR data", lambda: Parser.from_ir(ir)),
+    ]:
+        runs = timeit.repeat(build, number=1, repeat=repeat)
+        print(f"{label:<10} {min(runs) * 1e3:10.2f} ms")
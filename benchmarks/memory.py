@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Measure the memory used to compile a large grammar and to parse a long argv.
+
+Usage:
+  memory.py [--options=<n>] [--commands=<n>] [--tokens=<n>]
+
+Options:
+  --options=<n>   Number of generated options [default: 200] [type: int]
+  --commands=<n>  Number of generated commands [default: 200] [type: int]
+  --tokens=<n>    Number of tokens in the parsed argv [default: 100000] [type: int]
+"""
+
+import tracemalloc
+
+from docopt import Parser
+from docopt import docopt
+
+
+def generate_docstring(n_options: int, n_commands: int) -> str:
+    commands = "|".join(f"cmd{i}" for i in range(n_commands))
+    options = "\n".join(f"  --opt{i}=<v>  Option {i}." for i in range(n_options))
+    return (
+        f"Usage:\n  prog [options] ({commands}) [--] <file>...\n\n"
+        f"Options:\n  -v, --verbose  Be verbose.\n{options}\n"
+    )
+
+
+def generate_argv(n_tokens: int) -> list:
+    return ["-v", "cmd0", "--opt0=x", "--"] + [
+        f"path/to/file{i}.txt" for i in range(n_tokens - 4)
+    ]
+
+
+def measure(label: str, function, *args):
+    tracemalloc.start()
+    result = function(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} retained {current / 1e6:8.2f} MB   peak {peak / 1e6:8.2f} MB")
+    return result
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    docstring = generate_docstring(arguments["--options"], arguments["--commands"])
+    argv = generate_argv(arguments["--tokens"])
+    parser = measure("compile", Parser, docstring)
+    measure("parse", parser.parse, argv)
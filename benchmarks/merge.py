@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Compare merging plugin fragments into a parser with compiling the combined
+docstring, and time merging one more fragment into the result.
+
+Usage:
+  merge.py [--plugins=<n>] [--repeat=<n>]
+
+Options:
+  --plugins=<n>  Number of generated plugins [default: 500] [type: int]
+  --repeat=<n>   Number of timed runs, the best is reported [default: 3]
+                 [type: int]
+"""
+
+import timeit
+
+from docopt import Parser
+from docopt import docopt
+
+BASE = "Usage:\n  prog [options] status\n\nOptions:\n  -v, --verbose  Be verbose.\n"
+
+
+def generate_fragment(i: int) -> str:
+    return (
+        f"Usage:\n  prog cmd{i} [--opt{i}=<v>] [options] <file>...\n\n"
+        f"Options:\n  --opt{i}=<v>  Option {i} [default: {i}].\n"
+        f"  --flag{i}  Flag {i}.\n"
+    )
+
+
+def combine(fragments: list) -> str:
+    usages, options = zip(
+        *(f[len("Usage:\n") :].split("\n\nOptions:\n") for f in [BASE, *fragments])
+    )
+    return f"Usage:\n{''.join(usages)}\nOptions:\n{''.join(options)}"
+
+
+def merge_all(fragments: list) -> Parser:
+    parser = Parser(BASE)
+    for fragment in fragments:
+        parser.merge(fragment)
+    return parser
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    repeat = arguments["--repeat"]
+    fragments = [generate_fragment(i) for i in range(arguments["--plugins"])]
+    docstring = combine(fragments)
+    for label, build in [
+        ("docstring", lambda: Parser(docstring)),
+        ("merge", lambda: merge_all(fragments)),
+    ]:
+        runs = timeit.repeat(build, number=1, repeat=repeat)
+        print(f"{label:<10} {min(runs) * 1e3:10.2f} ms")
+    parser = merge_all(fragments)
+    extra = generate_fragment(len(fragments))
+    elapsed = timeit.timeit(lambda: parser.merge(extra), number=1)
+    print(f"{'one more':<10} {elapsed * 1e3:10.2f} ms")
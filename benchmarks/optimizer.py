@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Compare the size of the pattern tree and the time to match argument
+vectors with it before and after it is optimized.
+
+Usage:
+  optimizer.py [--groups=<n>] [--parses=<n>] [--repeat=<n>]
+
+Options:
+  --groups=<n>  Number of generated command groups [default: 20] [type: int]
+  --parses=<n>  Number of parsed argument vectors [default: 5000] [type: int]
+  --repeat=<n>  Number of timed runs, the best is reported [default: 3]
+                [type: int]
+"""
+
+import random
+import timeit
+from unittest import mock
+
+import docopt
+from docopt import Parser
+
+SUBCOMMANDS = [
+    "add [--fetch] <name> <url>",
+    "rename <old> <new>",
+    "remove <name>",
+    "set-url [--push] <name> <url>",
+    "show [<name>...]",
+    "prune [--dry-run] <name>",
+]
+
+
+def generate_docstring(n_groups: int) -> str:
+    usages = "".join(
+        f"  tool group{i} [--quiet] {subcommand}\n"
+        for i in range(n_groups)
+        for subcommand in SUBCOMMANDS
+    )
+    return (
+        f"Usage:\n{usages}\nOptions:\n"
+        "  --quiet    Print less.\n"
+        "  --fetch    Fetch after adding.\n"
+        "  --push     Set the push URL.\n"
+        "  --dry-run  Only show what would be pruned.\n"
+    )
+
+
+def generate_argvs(n_groups: int, n_parses: int) -> list:
+    r = random.Random(0)
+    return [
+        [f"group{r.randrange(n_groups)}", "--quiet"]
+        + r.choice(
+            [
+                ["add", "--fetch", "origin", "url"],
+                ["rename", "a", "b"],
+                ["remove", "origin"],
+                ["set-url", "origin", "url"],
+                ["show", "a", "b", "c"],
+                ["prune", "--dry-run", "origin"],
+            ]
+        )
+        for _ in range(n_parses)
+    ]
+
+
+def size(pattern) -> int:
+    return 1 + sum(map(size, getattr(pattern, "children", ())))
+
+
+if __name__ == "__main__":
+    arguments = docopt.docopt(__doc__)
+    repeat = arguments["--repeat"]
+    doc = generate_docstring(arguments["--groups"])
+    argvs = generate_argvs(arguments["--groups"], arguments["--parses"])
+    with mock.patch.object(docopt._BranchPattern, "optimize", lambda p: p):
+        unoptimized = Parser(doc)
+    optimized = Parser(doc)
+    assert [unoptimized.parse(argv) for argv in argvs] == [
+        optimized.parse(argv) for argv in argvs
+    ]
+    for label, parser in [("before", unoptimized), ("after", optimized)]:
+        runs = timeit.repeat(
+            lambda: [parser.parse(argv) for argv in argvs], number=1, repeat=repeat
+        )
+        print(
+            f"{label:<10} {min(runs) * 1e3:10.2f} ms  {size(parser._pattern):6d} nodes"
+        )
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Time parsing the option descriptions of a help text with many options.
+
+Usage:
+  options.py [--repeat=<n>] [<count>...]
+
+Options:
+  --repeat=<n>  Number of timed runs, the best is reported [default: 5]
+                [type: int]
+
+The time per option should stay flat as the number of options grows.
+"""
+
+import timeit
+
+from docopt import _parse_options
+from docopt import docopt
+
+
+def generate_options(n_options: int) -> str:
+    return "Options:\n" + "".join(
+        f"  -o{i} VALUE, --option-{i}=VALUE  Option number {i}, spread\n"
+        f"                      over two lines [default: {i}] [type: int]\n"
+        for i in range(n_options)
+    )
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    for count in arguments["<count>"] or [1000, 10000, 100000]:
+        text = generate_options(int(count))
+        runs = timeit.repeat(
+            lambda: _parse_options(text), number=1, repeat=arguments["--repeat"]
+        )
+        best = min(runs)
+        print(
+            f"{int(count):>8} options {best * 1e3:10.2f} ms "
+            f"{best / int(count) * 1e6:8.2f} us/option"
+        )
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Compare `Parser.parse_many` with and without `shared_prefixes` on a corpus
+of argument vectors in which a given fraction of the tokens are a prefix
+shared with other argument vectors.
+
+Usage:
+  prefixes.py [--parses=<n>] [--tokens=<n>] [--overlap=<f>] [--prefixes=<n>]
+              [--repeat=<n>]
+
+Options:
+  --parses=<n>    Number of parsed argument vectors [default: 20000] [type: int]
+  --tokens=<n>    Number of tokens in each argument vector [default: 20]
+                  [type: int]
+  --overlap=<f>   Fraction of the tokens in the shared prefix [default: 0.8]
+                  [type: float]
+  --prefixes=<n>  Number of distinct prefixes [default: 10] [type: int]
+  --repeat=<n>    Number of timed runs, the best is reported [default: 3]
+                  [type: int]
+"""
+
+import random
+import timeit
+
+from docopt import Parser
+from docopt import docopt
+
+DOC = """Usage:
+  tool deploy [--env=<e>] [--region=<r>] [-v...] [--tag=<t>...] <target>...
+  tool rollback [--env=<e>] [-v...] [--tag=<t>...] <target>...
+
+Options:
+  --env=<e>      Environment.
+  --region=<r>   Region.
+  --tag=<t>      Tag, can be repeated.
+  -v, --verbose  Be more verbose, can be repeated.
+"""
+
+
+def generate_argvs(n_parses: int, n_tokens: int, overlap: float, n_prefixes: int):
+    r = random.Random(0)
+    n_shared = min(max(1, round(n_tokens * overlap)), n_tokens - 1)
+    prefixes = []
+    for i in range(n_prefixes):
+        prefix = [r.choice(["deploy", "rollback"]), f"--env=e{i}"]
+        while len(prefix) < n_shared:
+            prefix += r.choice([["--tag", f"t{len(prefix)}"], ["-v"]])
+        prefix = prefix[:n_shared]
+        # The prefix can't end with an option that takes the next token.
+        if prefix[-1] == "--tag":
+            prefix[-1] = "-v"
+        prefixes.append(prefix)
+    return [
+        r.choice(prefixes)
+        + [f"host{r.randrange(10**6)}" for _ in range(n_tokens - n_shared)]
+        for _ in range(n_parses)
+    ]
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    repeat = arguments["--repeat"]
+    argvs = generate_argvs(
+        arguments["--parses"],
+        arguments["--tokens"],
+        arguments["--overlap"],
+        arguments["--prefixes"],
+    )
+    parser = Parser(DOC)
+    assert parser.parse_many(argvs) == parser.parse_many(argvs, shared_prefixes=True)
+    for label, shared in [("unshared", False), ("shared", True)]:
+        runs = timeit.repeat(
+            lambda: parser.parse_many(argvs, shared), number=1, repeat=repeat
+        )
+        print(f"{label:<10} {min(runs) * 1e3:10.2f} ms")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Compare matching argument vectors with the pattern tree and with the
+program compiled from it, and the memory each of them takes, for a deeply
+nested grammar the deterministic matcher can't match.
+
+Usage:
+  program.py [--depth=<n>] [--parses=<n>] [--repeat=<n>]
+
+Options:
+  --depth=<n>   Depth of the nested optional groups [default: 30] [type: int]
+  --parses=<n>  Number of parsed argument vectors [default: 1000] [type: int]
+  --repeat=<n>  Number of timed runs, the best is reported [default: 3]
+                [type: int]
+"""
+
+import random
+import sys
+import timeit
+
+from docopt import Parser
+from docopt import docopt
+
+
+def generate_docstring(depth: int) -> str:
+    # Each level takes an argument, or an option and the next level, which
+    # can't be told apart from the next positional argument alone.
+    nested = ""
+    for i in reversed(range(depth)):
+        nested = f"[<x{i}> | --a{i} {nested}]"
+    options = "".join(f"  --a{i}  Option {i}.\n" for i in range(depth))
+    return f"Usage:\n  tool run {nested}\n  tool <file>\n\nOptions:\n{options}"
+
+
+def generate_argvs(depth: int, n_parses: int) -> list:
+    r = random.Random(0)
+    argvs = []
+    for _ in range(n_parses):
+        levels = r.randrange(depth + 1)
+        argv = [f"--a{i}" for i in range(levels)]
+        r.shuffle(argv)
+        if levels < depth:
+            argv.insert(r.randrange(len(argv) + 1), f"x{levels}")
+        argvs.append(["run"] + argv)
+    return argvs
+
+
+class TreeParser(Parser):
+    """Matches with the pattern tree, as docopt did before the program."""
+
+    def _match_values(self, parsed):
+        index = self._first_index
+        for number in index.candidates(parsed):
+            matched, left, collected = index.lines[number].match(parsed, [])
+            if matched and not left:
+                return {a.name: a.value for a in collected}
+        return None
+
+
+def tree_size(node) -> int:
+    size = sys.getsizeof(node) + sys.getsizeof(getattr(node, "children", ()))
+    return size + sum(map(tree_size, getattr(node, "children", ())))
+
+
+def program_size(program) -> int:
+    return sum(
+        sys.getsizeof(getattr(program, name))
+        for name in ("code", "entries", "names", "hows")
+    ) + sum(map(sys.getsizeof, program.names))
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    repeat = arguments["--repeat"]
+    doc = generate_docstring(arguments["--depth"])
+    argvs = generate_argvs(arguments["--depth"], arguments["--parses"])
+    tree, program = TreeParser(doc), Parser(doc)
+    assert program.engine == "general"
+    assert [tree.parse(argv) for argv in argvs] == [
+        program.parse(argv) for argv in argvs
+    ]
+    sizes = {
+        "tree": tree_size(tree._pattern),
+        "program": program_size(program._compiled_program()),
+    }
+    for label, parser in [("tree", tree), ("program", program)]:
+        runs = timeit.repeat(
+            lambda: [parser.parse(argv) for argv in argvs], number=1, repeat=repeat
+        )
+        print(f"{label:<10} {min(runs) * 1e3:10.2f} ms  {sizes[label]:8d} bytes")
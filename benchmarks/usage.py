@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Time compiling a docstring with many usage patterns.
+
+Usage:
+  usage.py [--repeat=<n>] [<lines>...]
+
+Options:
+  --repeat=<n>  Number of timed runs, the best is reported [default: 3]
+                [type: int]
+
+The time per usage line should stay flat as the number of lines grows.
+"""
+
+import timeit
+
+from docopt import Parser
+from docopt import docopt
+
+
+def generate_docstring(n_lines: int) -> str:
+    usage = "".join(
+        f"  prog cmd{i} [-v | --quiet] (<src> <dst> | --all) [<file>...]\n"
+        for i in range(n_lines)
+    )
+    return f"Usage:\n{usage}\nOptions:\n  -v  Verbose.\n  --quiet  Quiet.\n"
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+    for lines in arguments["<lines>"] or [100, 1000, 5000]:
+        docstring = generate_docstring(int(lines))
+        runs = timeit.repeat(
+            lambda: Parser(docstring), number=1, repeat=arguments["--repeat"]
+        )
+        best = min(runs)
+        print(
+            f"{int(lines):>8} lines {best * 1e3:10.2f} ms "
+            f"{best / int(lines) * 1e6:8.2f} us/line"
+        )
@@ -24,11 +24,23 @@ Contributors (roughly in chronological order):
 
 from __future__ import annotations
 
+import importlib
+import json
 import re
 import sys
+import threading
+from array import array
+from collections import Counter
+from collections import OrderedDict
+from collections import namedtuple
 from typing import Any
 from typing import Callable
+from typing import ClassVar
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import NamedTuple
+from typing import NoReturn
 from typing import Tuple
 from typing import Type
 from typing import Union
@@ -36,7 +48,20 @@ from typing import cast
 
 from ._version import __version__ as __version__
 
-__all__ = ["docopt", "DocoptExit", "ParsedOptions"]
+__all__ = [
+    "docopt",
+    "DocoptExit",
+    "ParsedOptions",
+    "ParsedRecord",
+    "Parser",
+    "CacheInfo",
+    "ParsedColumns",
+    "StringColumn",
+    "NumberColumn",
+    "ListColumn",
+    "Grammar",
+    "Commands",
+]
 
 
 def _levenshtein_norm(source: str, target: str) -> float:
@@ -114,6 +139,8 @@ class DocoptExit(SystemExit):
 
 
 class _Pattern:
+    __slots__ = ("_name", "value")
+
     def __init__(
         self, name: str | None, value: list[str] | str | int | None = None
     ) -> None:
@@ -123,11 +150,8 @@ class _Pattern:
     def name(self) -> str | None:
         return self._name
 
-    def __eq__(self, other) -> bool:
-        return repr(self) == repr(other)
-
-    def __hash__(self) -> int:
-        return hash(repr(self))
+    def flat(self, *types) -> Any:
+        raise NotImplementedError  # pragma: no cover
 
 
 def _transform(pattern: _BranchPattern) -> _Either:
@@ -163,6 +187,26 @@ _SingleMatch = Union[Tuple[int, "_LeafPattern"], Tuple[None, None]]
 class _LeafPattern(_Pattern):
     """Leaf/terminal node of a pattern tree."""
 
+    __slots__ = ()
+    _kind = 0
+
+    def _identity(self) -> tuple:
+        """What makes two leaves the same element, whatever their values."""
+        return (self._kind, self.name)
+
+    # Equality and hashing are structural and don't render the repr, so
+    # that equal tips of a pattern tree can be found with a dict.
+    def __eq__(self, other) -> bool:
+        return (
+            type(self) is type(other)
+            and self._identity() == other._identity()
+            and type(self.value) is type(other.value)
+            and self.value == other.value
+        )
+
+    def __hash__(self) -> int:
+        return hash(self._identity())
+
     def __repr__(self) -> str:
         return "%s(%r, %r)" % (self.__class__.__name__, self.name, self.value)
 
@@ -206,6 +250,8 @@ class _LeafPattern(_Pattern):
 class _BranchPattern(_Pattern):
     """Branch/inner node of a pattern tree."""
 
+    __slots__ = ("children",)
+
     def __init__(self, *children) -> None:
         self.children = list(children)
 
@@ -217,16 +263,43 @@ class _BranchPattern(_Pattern):
     def fix(self) -> _BranchPattern:
         self.fix_identities()
         self.fix_repeating_arguments()
+        self.optimize()
+        return self
+
+    def optimize(self) -> _BranchPattern:
+        """Rewrite the tree under this node into an equivalent, smaller one.
+
+        Groups are flattened into groups of the same kind, and groups of a
+        single element replaced by it. Later duplicates of an alternative are
+        dropped, and adjacent alternatives that start with the same element
+        become that element followed by the alternatives of what comes after
+        it. Elements that count or collect repeated values are never dropped
+        or shared this way, since matching them again adds to the values of
+        the elements with their name that were matched before.
+
+        Empty [options] shortcuts are kept, as `Parser.merge` adds the options
+        it describes to them in place; the matchers compiled from the pattern
+        leave them out instead, see `_skipped`.
+        """
+        children: list[_Pattern] = []
+        for child in self.children:
+            if isinstance(child, _BranchPattern):
+                child = _simplest(child.optimize())
+            if type(child) is type(self) and type(self) in _FLATTENED:
+                children += cast(_BranchPattern, child).children
+            else:
+                children.append(child)
+        if type(self) is _Either:
+            children = _factor(_dedupe(children))
+        self.children = children
         return self
 
-    def fix_identities(self, uniq: list | None = None) -> None:
+    def fix_identities(self, uniq: dict | None = None) -> None:
         """Make pattern-tree tips point to same object if they are equal."""
-        flattened = self.flat()
-        uniq = list(set(flattened)) if uniq is None else uniq
+        uniq = {} if uniq is None else uniq
         for i, child in enumerate(self.children):
             if not hasattr(child, "children"):
-                assert child in uniq
-                self.children[i] = uniq[uniq.index(child)]
+                self.children[i] = uniq.setdefault(child, child)
             else:
                 child.fix_identities(uniq)
         return None
@@ -235,7 +308,8 @@ class _BranchPattern(_Pattern):
         """Fix elements that should accumulate/increment values."""
         either = [list(child.children) for child in _transform(self).children]
         for case in either:
-            for e in [child for child in case if case.count(child) > 1]:
+            counts = Counter(case)
+            for e in [child for child in case if counts[child] > 1]:
                 if type(e) is _Argument or type(e) is _Option and e.argcount:
                     if e.value is None:
                         e.value = []
@@ -246,6 +320,12 @@ class _BranchPattern(_Pattern):
                     e.value = 0
         return self
 
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.children == other.children
+
+    def __hash__(self) -> int:
+        return hash((type(self), *self.children))
+
     def __repr__(self) -> str:
         return "%s(%s)" % (
             self.__class__.__name__,
@@ -255,10 +335,16 @@ class _BranchPattern(_Pattern):
     def flat(self, *types) -> Any:
         if type(self) in types:
             return [self]
-        return sum([child.flat(*types) for child in self.children], [])
+        result = []
+        for child in self.children:
+            result += child.flat(*types)
+        return result
 
 
 class _Argument(_LeafPattern):
+    __slots__ = ()
+    _kind = 1
+
     def single_match(self, left: list[_LeafPattern]) -> _SingleMatch:
         for n, pattern in enumerate(left):
             if type(pattern) is _Argument:
@@ -267,6 +353,9 @@ class _Argument(_LeafPattern):
 
 
 class _Command(_Argument):
+    __slots__ = ()
+    _kind = 2
+
     def __init__(self, name: str | None, value: bool = False) -> None:
         self._name, self.value = name, value
 
@@ -281,6 +370,9 @@ class _Command(_Argument):
 
 
 class _Option(_LeafPattern):
+    __slots__ = ("short", "longer", "argcount", "type_name")
+    _kind = 3
+
     def __init__(
         self,
         short: str | None = None,
@@ -291,25 +383,17 @@ class _Option(_LeafPattern):
         assert argcount in (0, 1)
         self.short, self.longer, self.argcount = short, longer, argcount
         self.value = None if value is False and argcount else value
+        self.type_name: str | None = None
 
     @classmethod
     def parse(cls, option_description: str) -> _Option:
-        short, longer, argcount, value = None, None, 0, False
-        options, description = re.split(
-            r"(?:  )|$", option_description.strip(), flags=re.M, maxsplit=1
-        )
-        options = options.replace(",", " ").replace("=", " ")
-        for s in options.split():
-            if s.startswith("--"):
-                longer = s
-            elif s.startswith("-"):
-                short = s
-            else:
-                argcount = 1
-        if argcount:
-            matched = re.findall(r"\[default: (.*)\]", description, flags=re.I)
-            value = matched[0] if matched else None
-        return cls(short, longer, argcount, value)
+        return cls.from_record(_option_record(option_description))
+
+    @classmethod
+    def from_record(cls, record: _OptionRecord) -> _Option:
+        option = cls(record.short, record.longer, record.argcount, record.default)
+        option.type_name = record.type_name
+        return option
 
     def single_match(self, left: list[_LeafPattern]) -> _SingleMatch:
         for n, pattern in enumerate(left):
@@ -328,6 +412,9 @@ class _Option(_LeafPattern):
     def name(self) -> str | None:
         return self.longer or self.short
 
+    def _identity(self) -> tuple:
+        return (self._kind, self.short, self.longer, self.argcount)
+
     def __repr__(self) -> str:
         return "Option(%r, %r, %r, %r)" % (
             self.short,
@@ -338,6 +425,8 @@ class _Option(_LeafPattern):
 
 
 class _Required(_BranchPattern):
+    __slots__ = ()
+
     def match(
         self, left: list[_Pattern], collected: list[_Pattern] | None = None
     ) -> Any:
@@ -352,6 +441,8 @@ class _Required(_BranchPattern):
 
 
 class _NotRequired(_BranchPattern):
+    __slots__ = ()
+
     def match(
         self, left: list[_Pattern], collected: list[_Pattern] | None = None
     ) -> Any:
@@ -364,13 +455,20 @@ class _NotRequired(_BranchPattern):
 class _OptionsShortcut(_NotRequired):
     """Marker/placeholder for [options] shortcut."""
 
+    __slots__ = ()
+
 
 class _OneOrMore(_BranchPattern):
+    __slots__ = ()
+
     def match(
         self, left: list[_Pattern], collected: list[_Pattern] | None = None
     ) -> Any:
         assert len(self.children) == 1
         collected = [] if collected is None else collected
+        child = self.children[0]
+        if type(child) is _Argument and type(child.value) is list:
+            return self._match_arguments(child, left, collected)
         original_collected = collected
         original_left = left
         last_left = None
@@ -386,45 +484,908 @@ class _OneOrMore(_BranchPattern):
             return True, left, collected
         return False, original_left, original_collected
 
+    @staticmethod
+    def _match_arguments(
+        argument: _Argument, left: list[_Pattern], collected: list[_Pattern]
+    ) -> Any:
+        """Match a repeated positional argument, like `<file>...`, in one pass.
+
+        Repeating the match would take every positional argument that is left,
+        one at a time, and re-slice `left` for each of them. This collects
+        them all into a single list instead, which shares the str objects of
+        the argument vector.
+        """
+        # The value of a positional argument in `left` is always its str.
+        values = cast("list[str]", [p.value for p in left if type(p) is _Argument])
+        if not values:
+            return False, left, collected
+        left = [p for p in left if type(p) is not _Argument]
+        same_name = [a for a in collected if a.name == argument.name]
+        if not same_name:
+            return True, left, collected + [_Argument(argument.name, values)]
+        if isinstance(same_name[0].value, list):
+            same_name[0].value += values
+        return True, left, collected
+
 
 class _Either(_BranchPattern):
+    __slots__ = ()
+
     def match(
         self, left: list[_Pattern], collected: list[_Pattern] | None = None
     ) -> Any:
         collected = [] if collected is None else collected
-        outcomes = []
+        best = None
+        final: bool | None = None
         for pattern in self.children:
-            matched, _, _ = outcome = pattern.match(left, collected)
+            matched, rest, _ = outcome = pattern.match(left, collected)
             if matched:
-                outcomes.append(outcome)
-        if outcomes:
-            return min(outcomes, key=lambda outcome: len(outcome[1]))
+                # The first alternative that leaves the least wins, and none
+                # can leave less than nothing. Matching the others could still
+                # add to counts and lists collected before this group, which
+                # is only ruled out when there are none; flags aren't counted,
+                # as the elements with their name are flags too.
+                if not rest:
+                    if final is None:
+                        final = not any(type(a.value) in (int, list) for a in collected)
+                    if final:
+                        return outcome
+                if best is None or len(rest) < len(best[1]):
+                    best = outcome
+        if best is not None:
+            return best
         return False, left, collected
 
 
-class _Tokens(list):
+# Groups that mean the same when nested in a group of their own kind.
+_FLATTENED = (_Required, _NotRequired, _Either)
+
+
+def _simplest(pattern: _BranchPattern) -> _Pattern:
+    """`pattern`, or its only element if it means the same on its own."""
+    if type(pattern) in (_Required, _Either) and len(pattern.children) == 1:
+        return pattern.children[0]
+    return pattern
+
+
+def _accumulates(pattern: _Pattern) -> bool:
+    """Whether matching `pattern` can add to values matched before."""
+    return any(type(leaf.value) in (int, list) for leaf in pattern.flat())
+
+
+def _dedupe(alternatives: list[_Pattern]) -> list[_Pattern]:
+    """Drop the alternatives that are the same as an earlier one, which
+    matches the same and wins any tie."""
+    seen: set[_Pattern] = set()
+    result = []
+    for alternative in alternatives:
+        if alternative in seen and not _accumulates(alternative):
+            continue
+        seen.add(alternative)
+        result.append(alternative)
+    return result
+
+
+def _head(alternative: _Pattern) -> _Pattern:
+    if type(alternative) is _Required and alternative.children:
+        return alternative.children[0]
+    return alternative
+
+
+def _tail(alternative: _Pattern) -> _Required:
+    if type(alternative) is _Required:
+        return _Required(*alternative.children[1:])
+    return _Required()
+
+
+def _factor(alternatives: list[_Pattern]) -> list[_Pattern]:
+    """Match the element adjacent `alternatives` start with only once.
+
+    `(a b | a c)` becomes `(a (b | c))`: `a` matches the same way in both,
+    and the alternative that leaves the fewest arguments after it is the
+    one that wins either way. Only elements that take the first positional
+    argument are factored out, which keeps usage lines that start with
+    different command words apart for `_FirstIndex`.
+    """
+    result: list[_Pattern] = []
+    i = 0
+    while i < len(alternatives):
+        head = _head(alternatives[i])
+        j = i + 1
+        if not _accumulates(head) and not _first(head)[2]:
+            while j < len(alternatives) and _head(alternatives[j]) == head:
+                j += 1
+        if j - i == 1:
+            result.append(alternatives[i])
+        else:
+            rest = _simplest(_Either(*map(_tail, alternatives[i:j])).optimize())
+            if type(rest) is _Required:
+                result.append(_Required(head, *cast(_Required, rest).children))
+            else:
+                result.append(_Required(head, rest))
+        i = j
+    return result
+
+
+class _PatternIndex(NamedTuple):
+    """The leaves of a pattern tree by type, its [options] shortcuts, and the
+    default value of each element, all gathered in a single walk."""
+
+    leaves: dict[type, tuple[_LeafPattern, ...]]
+    shortcuts: tuple[_OptionsShortcut, ...]
+    defaults: dict[str, Any]
+
+
+def _index(pattern: _BranchPattern) -> _PatternIndex:
+    leaves: dict[type, list[_LeafPattern]] = {}
+    shortcuts = []
+    defaults: dict[str, Any] = {}
+    stack: list[_Pattern] = [pattern]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, _BranchPattern):
+            if type(node) is _OptionsShortcut:
+                shortcuts.append(node)
+            stack += reversed(node.children)
+        else:
+            node = cast(_LeafPattern, node)
+            leaves.setdefault(type(node), []).append(node)
+            defaults[cast(str, node.name)] = node.value
+    return _PatternIndex(
+        {leaf_type: tuple(found) for leaf_type, found in leaves.items()},
+        tuple(shortcuts),
+        defaults,
+    )
+
+
+def _usage_lines(pattern: _Required) -> list[_Pattern]:
+    """Split a parsed usage pattern into its alternatives, one per line."""
+    top = pattern.children
+    if len(top) == 1 and type(top[0]) is _Either:
+        return list(cast(_Either, top[0]).children)
+    if len(top) == 1:
+        return [top[0]]
+    return [_Required(*top)]
+
+
+def _canonicalize(pattern: _BranchPattern, canonical: dict[tuple, _Pattern]) -> None:
+    """Make the tips of `pattern` the leaves of `canonical` with the same
+    identity, adding the ones that aren't there yet."""
+    for i, child in enumerate(pattern.children):
+        if isinstance(child, _BranchPattern):
+            _canonicalize(child, canonical)
+        else:
+            child = cast(_LeafPattern, child)
+            pattern.children[i] = canonical.setdefault(child._identity(), child)
+
+
+def _repeats_shortcuts(pattern: _BranchPattern) -> bool:
+    """Whether a case of `pattern` has more than one [options] shortcut, which
+    makes the options in them repeated, whatever they are."""
+    marker = _Argument(None)
+
+    def skeleton(node: _Pattern) -> _Pattern:
+        if type(node) is _OptionsShortcut:
+            return _OptionsShortcut(marker)
+        if isinstance(node, _BranchPattern):
+            return type(node)(*map(skeleton, node.children))
+        return node
+
+    cases = _transform(cast(_BranchPattern, skeleton(pattern))).children
+    return any(
+        sum(child is marker for child in cast(_Required, case).children) > 1
+        for case in cases
+    )
+
+
+def _first(pattern: _Pattern) -> tuple[set[str], bool, bool]:
+    """The command words `pattern` can match the first positional argument
+    with, whether it can match it with an argument, and whether it can match
+    without any positional argument.
+
+    Every positional element matches the first positional argument that is
+    left, so the first one to match takes the first of the argument vector.
+    """
+    kind = type(pattern)
+    if kind is _Command:
+        return {cast(str, pattern.name)}, False, False
+    if kind is _Argument:
+        return set(), True, False
+    if kind is _Option:
+        return set(), False, True
+    words: set[str] = set()
+    anything = False
+    nullable = kind is not _Either
+    for child in cast(_BranchPattern, pattern).children:
+        child_words, child_anything, child_nullable = _first(child)
+        words |= child_words
+        anything = anything or child_anything
+        if kind is _Either:
+            nullable = nullable or child_nullable
+        elif kind is not _NotRequired and kind is not _OptionsShortcut:
+            nullable = nullable and child_nullable
+            # The children of a group are matched in order, and one that
+            # can't be skipped hides the ones after it.
+            if not nullable:
+                break
+    return words, anything, nullable
+
+
+class _FirstIndex:
+    """The usage lines of a pattern by the first positional argument they can
+    match, so that only the lines that can match a whole argument vector are
+    tried. The first of them that does is the line the whole pattern matches
+    it with."""
+
+    __slots__ = ("lines", "by_word", "anything", "empty")
+
+    def __init__(self, lines: Iterable[_Pattern]) -> None:
+        self.lines: list[_Pattern] = []
+        # The numbers of the lines that can match a command word first, an
+        # argument first, and no positional argument at all.
+        self.by_word: dict[str, list[int]] = {}
+        self.anything: list[int] = []
+        self.empty: list[int] = []
+        self.extend(lines)
+
+    def extend(self, lines: Iterable[_Pattern]) -> None:
+        for line in lines:
+            number = len(self.lines)
+            self.lines.append(line)
+            words, anything, nullable = _first(line)
+            for word in words:
+                self.by_word.setdefault(word, []).append(number)
+            if anything:
+                self.anything.append(number)
+            if nullable:
+                self.empty.append(number)
+
+    def candidates(self, parsed: list[_Pattern]) -> list[int]:
+        """The numbers of the lines that can match all of `parsed`."""
+        for e in parsed:
+            if type(e) is _Argument:
+                numbers = self.by_word.get(cast(str, e.value))
+                if numbers is None:
+                    return self.anything
+                if not self.anything:
+                    return numbers
+                return sorted({*numbers, *self.anything})
+        return self.empty
+
+
+def _skipped(pattern: _Pattern) -> bool:
+    """Whether `pattern` holds nothing but empty [options] shortcuts, like
+    `[options]` when every option is in the usage pattern. It matches nothing,
+    so a group that matches its elements in order can leave it out."""
+    if type(pattern) not in (_Required, _NotRequired, _OptionsShortcut):
+        return False
+    return all(map(_skipped, cast(_BranchPattern, pattern).children))
+
+
+# Operations of the deterministic matcher, see `_deterministic`.
+(
+    _MATCH_COMMAND,
+    _MATCH_ARGUMENT,
+    _MATCH_OPTION,
+    _MATCH_ARGUMENTS,
+    _MATCH_SEQUENCE,
+    _MATCH_OPTIONAL,
+    _MATCH_REPEAT,
+    _MATCH_WORD,
+    _MATCH_CHOICE,
+) = range(9)
+
+# How a matched element sets its value: to what it matched, by counting its
+# matches, or by adding what it matched to a list.
+_SET, _COUNT, _APPEND = range(3)
+
+
+def _how(leaf: _Pattern) -> int:
+    value = leaf.value
+    return _COUNT if type(value) is int else _APPEND if type(value) is list else _SET
+
+
+def _deterministic(pattern: _Pattern) -> tuple | None:
+    """Compile `pattern` into operations for `_DeterministicRun`, or return
+    None if matching it can take backtracking.
+
+    Groups match their elements in order, and take each optional one that
+    matches, so only alternatives can need it. They don't when they are all
+    options, and the first one given is taken, or when none of them can match
+    without a positional argument and no two can start with the same one, so
+    that the next positional argument tells which one to match.
+    """
+    kind = type(pattern)
+    if kind is _Command or kind is _Argument or kind is _Option:
+        how = _how(pattern)
+        if kind is _Option:
+            return _MATCH_OPTION, pattern.name, how
+        if kind is _Command:
+            return _MATCH_COMMAND, pattern.name, how
+        return _MATCH_ARGUMENT, pattern.name, how
+    children = cast(_BranchPattern, pattern).children
+    if kind is _Either:
+        if all(type(child) is _Option for child in children):
+            return _MATCH_CHOICE, tuple(map(_deterministic, children))
+        table: dict[str, tuple] = {}
+        for child in children:
+            words, anything, nullable = _first(child)
+            if anything or nullable or not words.isdisjoint(table):
+                return None
+            compiled = _deterministic(child)
+            if compiled is None:
+                return None
+            table.update(dict.fromkeys(words, compiled))
+        return _MATCH_WORD, table
+    if kind is _OneOrMore:
+        child = children[0]
+        if type(child) is _Argument and type(child.value) is list:
+            return _MATCH_ARGUMENTS, child.name
+        compiled = _deterministic(child)
+        return None if compiled is None else (_MATCH_REPEAT, compiled)
+    steps = tuple(_deterministic(c) for c in children if not _skipped(c))
+    if None in steps:
+        return None
+    return (_MATCH_SEQUENCE if kind is _Required else _MATCH_OPTIONAL), steps
+
+
+class _Backtrack(Exception):
+    """Raised where only backtracking could tell how a pattern matches."""
+
+
+class _DeterministicRun:
+    """Match an argument vector with the operations of a deterministic pattern
+    in a single pass, setting the values of the result as it goes.
+
+    Positional arguments are taken in order, and options by name, in the
+    order they are given. An element that fails to match takes nothing, but
+    a group can fail after taking some; the general matcher would put those
+    back and go on if the group is optional or repeated, and `_Backtrack` is
+    raised instead.
+    """
+
+    __slots__ = ("positionals", "position", "options", "taken", "values")
+
+    def __init__(self, parsed: list[_Pattern]) -> None:
+        self.positionals = [e.value for e in parsed if type(e) is _Argument]
+        self.position = 0
+        # The values of each option, last first, so that they are taken by
+        # popping them.
+        self.options: dict[str, list[Any]] = {}
+        for e in reversed(parsed):
+            if type(e) is _Option:
+                self.options.setdefault(cast(str, e.name), []).append(e.value)
+        self.taken = 0
+        self.values: dict[str, Any] = {}
+
+    def take(self, name: str, how: int, value: Any) -> None:
+        self.taken += 1
+        if how == _SET:
+            self.values[name] = value
+        elif how == _COUNT:
+            self.values[name] = self.values.get(name, 0) + 1
+        else:
+            self.values.setdefault(name, []).append(value)
+
+    def run(self, op: tuple) -> bool:
+        code = op[0]
+        if code == _MATCH_OPTION:
+            given = self.options.get(op[1])
+            if not given:
+                return False
+            self.take(op[1], op[2], given.pop())
+            return True
+        if code == _MATCH_COMMAND or code == _MATCH_ARGUMENT:
+            if self.position == len(self.positionals):
+                return False
+            value = self.positionals[self.position]
+            if code == _MATCH_COMMAND:
+                if value != op[1]:
+                    return False
+                value = True
+            self.position += 1
+            self.take(op[1], op[2], value)
+            return True
+        if code == _MATCH_ARGUMENTS:
+            rest = self.positionals[self.position :]
+            if not rest:
+                return False
+            self.position += len(rest)
+            self.taken += len(rest)
+            values = self.values.get(op[1])
+            if values is None:
+                self.values[op[1]] = rest
+            else:
+                values += rest
+            return True
+        if code == _MATCH_SEQUENCE:
+            for step in op[1]:
+                if not self.run(step):
+                    return False
+            return True
+        if code == _MATCH_OPTIONAL:
+            for step in op[1]:
+                taken = self.taken
+                if not self.run(step) and self.taken != taken:
+                    raise _Backtrack
+            return True
+        if code == _MATCH_REPEAT:
+            if not self.run(op[1]):
+                return False
+            while True:
+                taken = self.taken
+                if not self.run(op[1]):
+                    if self.taken != taken:
+                        raise _Backtrack
+                    return True
+                if self.taken == taken:
+                    return True
+        if code == _MATCH_WORD:
+            if self.position == len(self.positionals):
+                return False
+            step = op[1].get(self.positionals[self.position])
+            return step is not None and self.run(step)
+        for step in op[1]:
+            if self.options.get(step[1]):
+                return self.run(step)
+        return False
+
+
+class _DeterministicMatcher:
+    """The usage lines of a pattern, compiled by `_deterministic`."""
+
+    __slots__ = ("lines",)
+
+    def __init__(self, lines: list[tuple]) -> None:
+        self.lines = lines
+
+    def match(self, parsed: list[_Pattern], numbers: list[int]) -> dict | None:
+        """The values of the first of the lines `numbers` that matches all of
+        `parsed`, or None if none does. Raises `_Backtrack` if one of them
+        can only be matched with backtracking."""
+        for number in numbers:
+            run = _DeterministicRun(parsed)
+            if run.run(self.lines[number]) and run.taken == len(parsed):
+                return run.values
+        return None
+
+
+# Instructions of a `_Program`. Elements come before groups, which are
+# numbered in the order `_Program.run` checks them.
+(
+    _OP_ARGUMENT,
+    _OP_COMMAND,
+    _OP_OPTION,
+    _OP_ARGUMENTS,
+    _OP_REQUIRED,
+    _OP_OPTIONAL,
+    _OP_REPEAT,
+    _OP_EITHER,
+) = range(8)
+_OP_GROUPS: dict[type, int] = {
+    _Required: _OP_REQUIRED,
+    _NotRequired: _OP_OPTIONAL,
+    _OptionsShortcut: _OP_OPTIONAL,
+    _OneOrMore: _OP_REPEAT,
+    _Either: _OP_EITHER,
+}
+
+
+class _Program:
+    """The usage lines of a pattern compiled into a flat array of instructions,
+    which `run` matches the way `match` does, without a call per node.
+
+    Each instruction is three ints: its operation, the position of the
+    instruction after it and everything it contains, and its operand. The
+    elements of a group follow it, and the operand of an element is its
+    number in the `names` and `hows` tables. `entries` is where each usage
+    line starts.
+    """
+
+    __slots__ = ("code", "entries", "names", "hows", "accumulates")
+
+    def __init__(
+        self, code: array, entries: array, names: list[str], hows: array
+    ) -> None:
+        self.code = code
+        self.entries = entries
+        self.names = names
+        self.hows = hows
+        # Whether any element counts or collects its values, without which
+        # the first alternative that matches everything always wins.
+        self.accumulates = any(how != _SET for how in hows)
+
+    @classmethod
+    def compile(cls, lines: Iterable[_Pattern]) -> _Program:
+        code = array("i")
+        entries = array("i")
+        operands: dict[tuple[str, int], int] = {}
+
+        def operand(leaf: _Pattern) -> int:
+            key = (cast(str, leaf.name), _how(leaf))
+            return operands.setdefault(key, len(operands))
+
+        def emit(node: _Pattern) -> None:
+            start = len(code)
+            kind = type(node)
+            if kind is _Option or kind is _Command or kind is _Argument:
+                op = _OP_OPTION if kind is _Option else _OP_COMMAND
+                op = _OP_ARGUMENT if kind is _Argument else op
+                code.extend((op, start + 3, operand(node)))
+                return
+            children = cast(_BranchPattern, node).children
+            child = children[0] if kind is _OneOrMore else None
+            if type(child) is _Argument and type(child.value) is list:
+                code.extend((_OP_ARGUMENTS, start + 3, operand(child)))
+                return
+            code.extend((_OP_GROUPS[kind], 0, 0))
+            for child in children:
+                if kind is _OneOrMore or kind is _Either or not _skipped(child):
+                    emit(child)
+            code[start + 1] = len(code)
+
+        for line in lines:
+            entries.append(len(code))
+            emit(line)
+        names = [name for name, _ in operands]
+        return cls(code, entries, names, array("i", (how for _, how in operands)))
+
+    def encode(self) -> dict[str, Any]:
+        return {
+            "code": self.code.tolist(),
+            "entries": self.entries.tolist(),
+            "names": list(self.names),
+            "hows": self.hows.tolist(),
+        }
+
+    @classmethod
+    def decode(cls, encoded: dict[str, Any]) -> _Program:
+        return cls(
+            array("i", encoded["code"]),
+            array("i", encoded["entries"]),
+            list(encoded["names"]),
+            array("i", encoded["hows"]),
+        )
+
+    def match(self, parsed: list[_Pattern], numbers: list[int]) -> dict | None:
+        """The values of the first of the lines `numbers` that matches all of
+        `parsed`, or None if none does."""
+        for number in numbers:
+            matched, left, collected = self.run(self.entries[number], parsed)
+            if matched and not left:
+                return {name: cell[0] for name, cell in collected.items()}
+        return None
+
+    def run(
+        self, pc: int, left: list[_Pattern]
+    ) -> tuple[bool, list[_Pattern], dict[str, list[Any]]]:
+        """Match `left` with the instruction at `pc`, as `match` would.
+
+        What is collected maps each name to a cell holding its value. Cells
+        are shared by what alternatives collect from the same values, so
+        that counting and adding to lists changes them all, as `match` does.
+        The groups being matched are kept on a stack, each with the values
+        it started from, to go back to if it fails.
+        """
+        code, names, hows = self.code, self.names, self.hows
+        accumulates = self.accumulates
+        collected: dict[str, list[Any]] = {}
+        # Each frame is the operation of a group, the position of the element
+        # being matched, the end of the group, the values it started from,
+        # and for alternatives the best outcome so far and whether the first
+        # complete one wins, or for repeats what was left after the last
+        # repetition and how many matched.
+        stack: list[list[Any]] = []
+        while True:
+            op = code[pc]
+            if op < _OP_ARGUMENTS:
+                operand = code[pc + 2]
+                name = names[operand]
+                n = -1
+                if op == _OP_OPTION:
+                    for i, e in enumerate(left):
+                        if e.name == name:
+                            n = i
+                            value = e.value
+                            if isinstance(value, list):
+                                value = value.copy()
+                            break
+                else:
+                    for i, e in enumerate(left):
+                        if type(e) is _Argument:
+                            value = e.value
+                            if op == _OP_ARGUMENT:
+                                n = i
+                            elif value == name:
+                                n = i
+                                value = True
+                            break
+                matched = n >= 0
+                if matched:
+                    left = left[:n] + left[n + 1 :]
+                    how = hows[operand]
+                    if how == _SET:
+                        collected = {**collected, name: [value]}
+                    else:
+                        cell = collected.get(name)
+                        if cell is None:
+                            if how == _COUNT:
+                                value = 1
+                            elif isinstance(value, str):
+                                value = [value]
+                            collected = {**collected, name: [value]}
+                        elif how == _COUNT:
+                            if isinstance(cell[0], int):
+                                cell[0] += 1
+                        elif type(value) is str and isinstance(cell[0], list):
+                            cell[0] += [value]
+            elif op == _OP_ARGUMENTS:
+                name = names[code[pc + 2]]
+                values = [e.value for e in left if type(e) is _Argument]
+                matched = bool(values)
+                if matched:
+                    left = [e for e in left if type(e) is not _Argument]
+                    cell = collected.get(name)
+                    if cell is None:
+                        collected = {**collected, name: [values]}
+                    elif isinstance(cell[0], list):
+                        cell[0] += values
+            else:
+                end = code[pc + 1]
+                if pc + 3 < end:
+                    stack.append([op, pc + 3, end, left, collected, None, 0])
+                    pc += 3
+                    continue
+                # An empty group.
+                matched = op != _OP_EITHER
+            # Hand the outcome to the groups it is in, until one of them has
+            # another element to match.
+            while stack:
+                frame = stack[-1]
+                kind = frame[0]
+                if kind == _OP_OPTIONAL or kind == _OP_REQUIRED:
+                    if not matched and kind == _OP_REQUIRED:
+                        stack.pop()
+                        left, collected = frame[3], frame[4]
+                        continue
+                    pc = code[frame[1] + 1]
+                    if pc < frame[2]:
+                        frame[1] = pc
+                        break
+                    stack.pop()
+                    matched = True
+                elif kind == _OP_EITHER:
+                    if matched:
+                        # As in `_Either.match`.
+                        if not left:
+                            if frame[6] == 0:
+                                frame[6] = 1 + (
+                                    not accumulates
+                                    or all(
+                                        type(cell[0]) not in (int, list)
+                                        for cell in frame[4].values()
+                                    )
+                                )
+                            if frame[6] == 2:
+                                stack.pop()
+                                continue
+                        best = frame[5]
+                        if best is None or len(left) < len(best[0]):
+                            frame[5] = left, collected
+                    pc = code[frame[1] + 1]
+                    if pc < frame[2]:
+                        frame[1] = pc
+                        left, collected = frame[3], frame[4]
+                        break
+                    stack.pop()
+                    matched = frame[5] is not None
+                    left, collected = frame[5] if matched else (frame[3], frame[4])
+                else:
+                    frame[6] += matched
+                    last = frame[5]
+                    if matched and (last is None or len(last) != len(left)):
+                        frame[5] = left
+                        pc = frame[1]
+                        break
+                    stack.pop()
+                    matched = frame[6] > 0
+                    if not matched:
+                        left, collected = frame[3], frame[4]
+            else:
+                return matched, left, collected
+
+
+def _add_options(options: list[_Option], new: Iterable[_Option]) -> None:
+    """Append the `new` options that aren't described in `options` yet."""
+    described: dict[str | None, tuple] = {}
+    for opt in options:
+        described[opt.short] = described[opt.longer] = opt._identity()
+    described.pop(None, None)
+    for opt in new:
+        identity = opt._identity()
+        names = [name for name in (opt.short, opt.longer) if name is not None]
+        for name in names:
+            if described.get(name, identity) != identity:
+                raise DocoptLanguageError(f"{name} is already described differently.")
+        if all(name in described for name in names):
+            continue
+        options.append(opt)
+        for name in names:
+            described[name] = identity
+
+
+_WORD = re.compile(r"\S+")
+_WHITESPACE = re.compile(r"\s")
+_PATTERN_SPECIAL = re.compile(r"[\[\]\(\)\|]|\.\.\.")
+_PATTERN_SPLIT = re.compile(r"\s+|(\S*<.*?>)")
+
+
+# Kinds of argument vector tokens.
+_POSITIONAL, _DOUBLE_DASH, _LONG, _LONG_WITH_VALUE, _SHORTS, _NUMBER, _DASH = range(7)
+
+
+def _argv_kind(token: str) -> int:
+    if token[:1] != "-":
+        return _POSITIONAL
+    if len(token) == 1:
+        return _DASH
+    if token[1] == "-":
+        if len(token) == 2:
+            return _DOUBLE_DASH
+        return _LONG_WITH_VALUE if "=" in token else _LONG
+    # Only tokens like "-1", "-.5", "-inf" or "-nan" can be numbers, so
+    # float() is only tried on those.
+    if token[1].isdecimal() or token[1] in ".iInN":
+        try:
+            float(token)
+            return _NUMBER
+        except ValueError:
+            pass
+    return _SHORTS
+
+
+class _Tokens:
+    """A stream of tokens, consumed from the front by moving a cursor.
+
+    Tokens lexed from a usage pattern can also find their offsets in the
+    `text` they come from, so that errors can point at them. `locate`
+    computes those offsets, only once an error needs them.
+    """
+
     def __init__(
         self,
         source: list[str] | str,
         error: Type[DocoptExit] | Type[DocoptLanguageError] = DocoptExit,
+        text: str = "",
+        locate: Callable[[], list[int]] | None = None,
     ) -> None:
-        if isinstance(source, list):
-            self += source
-        else:
-            self += source.split()
+        self._tokens = source if isinstance(source, list) else source.split()
+        self.position = 0
         self.error = error
+        self._text = text
+        self._locate = locate
+        self._offsets: list[int] | None = None
+        self._kinds: array | None = None
 
     @staticmethod
-    def from_pattern(source: str) -> _Tokens:
-        source = re.sub(r"([\[\]\(\)\|]|\.\.\.)", r" \1 ", source)
-        fragments = [s for s in re.split(r"\s+|(\S*<.*?>)", source) if s]
-        return _Tokens(fragments, error=DocoptLanguageError)
+    def from_pattern(
+        source: str, text: str = "", locate: Callable[[], list[int]] | None = None
+    ) -> _Tokens:
+        source = _PATTERN_SPECIAL.sub(r" \g<0> ", source)
+        fragments = [s for s in _PATTERN_SPLIT.split(source) if s]
+        return _Tokens(fragments, DocoptLanguageError, text, locate)
+
+    def __len__(self) -> int:
+        return len(self._tokens) - self.position
 
     def move(self) -> str | None:
-        return self.pop(0) if len(self) else None
+        if self.position < len(self._tokens):
+            self.position += 1
+            return self._tokens[self.position - 1]
+        return None
 
     def current(self) -> str | None:
-        return self[0] if len(self) else None
+        if self.position < len(self._tokens):
+            return self._tokens[self.position]
+        return None
+
+    def kinds(self) -> array:
+        """The kind of each token of an argument vector, classified once."""
+        if self._kinds is None:
+            self._kinds = array("b", map(_argv_kind, self._tokens))
+        return self._kinds
+
+    def rest(self) -> list[str]:
+        """Consume and return all the remaining tokens."""
+        rest = self._tokens[self.position :]
+        self.position = len(self._tokens)
+        return rest
+
+    def where(self, position: int) -> str:
+        """Describe where the token at `position` is, for error messages."""
+        if self._offsets is None and self._locate is not None:
+            self._offsets = self._locate()
+        if self._offsets is None or position >= len(self._offsets):
+            return ""
+        offset = self._offsets[position]
+        line = self._text.count("\n", 0, offset) + 1
+        column = offset - self._text.rfind("\n", 0, offset)
+        return f" (line {line}, column {column})"
+
+
+def _lex_usage(text: str, start: int = 0, end: int | None = None) -> _Tokens:
+    """Split the usage section's body, `text[start:end]`, into pattern tokens.
+
+    Each repetition of the program name starts a new alternative, and the
+    brackets, "|" and "..." are tokens of their own, except in a token like
+    `<name with spaces>`. Where the tokens are in `text` is only worked out
+    if an error needs it.
+    """
+    end = len(text) if end is None else end
+    return _Tokens.from_pattern(
+        _formal_usage(text[start:end]), text, lambda: _usage_offsets(text, start, end)
+    )
+
+
+def _usage_offsets(text: str, start: int, end: int) -> list[int]:
+    """Find where in `text` each token `_lex_usage` makes starts, by lexing
+    `text[start:end]` again while keeping track of positions."""
+    words = _WORD.finditer(text, start, end)
+    program = cast(re.Match, next(words))
+    # The formal usage, as pieces joined by single spaces, with the offset in
+    # `text` of each piece and whether its characters map one to one to it.
+    pieces: list[tuple[str, int, bool]] = [("(", program.start(), False)]
+    for word in words:
+        if word.group() == program.group():
+            pieces.append((") | (", word.start(), False))
+        else:
+            pieces.append((word.group(), word.start(), True))
+    pieces.append((")", end, False))
+    formal = " ".join(piece for piece, _, _ in pieces)
+    # Pad the special tokens with spaces, remembering the offsets in `formal`
+    # that each run of characters of `padded` starts at.
+    padded_parts, anchors = [], [(0, 0)]
+    last = shift = 0
+    for special in _PATTERN_SPECIAL.finditer(formal):
+        padded_parts += [formal[last : special.start()], f" {special.group()} "]
+        anchors.append((special.start() + shift + 1, special.start()))
+        shift += 2
+        anchors.append((special.end() + shift, special.end()))
+        last = special.end()
+    padded_parts.append(formal[last:])
+    padded = "".join(padded_parts)
+    token_starts = []
+    last = 0
+    for separator in _PATTERN_SPLIT.finditer(padded):
+        if separator.start() > last:
+            token_starts.append(last)
+        if separator.group(1):
+            token_starts.append(separator.start(1))
+        last = separator.end()
+    if last < len(padded):
+        token_starts.append(last)
+    # Map the starts of the tokens, which are in increasing order, back to
+    # `formal` and then to `text`.
+    offsets = []
+    anchor = piece = piece_start = 0
+    for token_start in token_starts:
+        while anchor + 1 < len(anchors) and anchors[anchor + 1][0] <= token_start:
+            anchor += 1
+        padded_offset, formal_offset = anchors[anchor]
+        formal_offset += token_start - padded_offset
+        while piece + 1 < len(pieces):
+            next_start = piece_start + len(pieces[piece][0]) + 1
+            if next_start > formal_offset:
+                break
+            piece, piece_start = piece + 1, next_start
+        _, offset, one_to_one = pieces[piece]
+        if one_to_one:
+            offset += formal_offset - piece_start
+        offsets.append(offset)
+    # The closing parenthesis added after the last line isn't in `text`, and
+    # errors at it point at the token before it instead.
+    offsets[-1] = offsets[-2]
+    return offsets
 
 
 def _parse_longer(
@@ -434,6 +1395,7 @@ def _parse_longer(
     more_magic: bool = False,
 ) -> list[_Pattern]:
     """longer ::= '--' chars [ ( ' ' | '=' ) chars ] ;"""
+    position = tokens.position
     current_token = tokens.move()
     if current_token is None or not current_token.startswith("--"):
         raise ValueError(
@@ -445,22 +1407,11 @@ def _parse_longer(
     else:
         value = maybe_value
     similar = [o for o in options if o.longer and longer == o.longer]
-    start_collision = (
-        len(
-            [
-                o
-                for o in options
-                if o.longer and longer in o.longer and o.longer.startswith(longer)
-            ]
-        )
-        > 1
-    )
-    if argv and not len(similar) and not start_collision:
-        similar = [
-            o
-            for o in options
-            if o.longer and longer in o.longer and o.longer.startswith(longer)
-        ]
+    if argv and not similar:
+        # An unambiguous prefix of a long option stands for it.
+        prefixed = [o for o in options if o.longer and o.longer.startswith(longer)]
+        if len(prefixed) <= 1:
+            similar = prefixed
     # try advanced matching
     if more_magic and not similar:
         corrected = [
@@ -472,7 +1423,9 @@ def _parse_longer(
             print(f"NB: Corrected {corrected[0][0]} to {corrected[0][1].longer}")
         similar = [correct for (original, correct) in corrected]
     if len(similar) > 1:
-        raise DocoptLanguageError(f"{longer} is not a unique prefix: {similar}?")
+        raise DocoptLanguageError(
+            f"{longer} is not a unique prefix: {similar}?" + tokens.where(position)
+        )
     elif len(similar) < 1:
         argcount = 1 if maybe_eq == "=" else 0
         o = _Option(None, longer, argcount)
@@ -485,11 +1438,15 @@ def _parse_longer(
         )
         if o.argcount == 0:
             if value is not None:
-                raise tokens.error("%s must not have an argument" % o.longer)
+                raise tokens.error(
+                    "%s must not have an argument" % o.longer + tokens.where(position)
+                )
         else:
             if value is None:
                 if tokens.current() in [None, "--"]:
-                    raise tokens.error("%s requires argument" % o.longer)
+                    raise tokens.error(
+                        "%s requires argument" % o.longer + tokens.where(position)
+                    )
                 value = tokens.move()
         if tokens.error is DocoptExit:
             o.value = value if value is not None else True
@@ -500,6 +1457,7 @@ def _parse_shorts(
     tokens: _Tokens, options: list[_Option], more_magic: bool = False
 ) -> list[_Pattern]:
     """shorts ::= '-' ( chars )* [ [ ' ' ] chars ] ;"""
+    position = tokens.position
     token = tokens.move()
     if token is None or not token.startswith("-") or token.startswith("--"):
         raise ValueError(
@@ -573,6 +1531,7 @@ def _parse_shorts(
         if len(similar) > 1:
             raise DocoptLanguageError(
                 f"{short} is specified ambiguously {len(similar)} times"
+                + tokens.where(position)
             )
         elif len(similar) < 1:
             o = _Option(short, None, 0)
@@ -595,7 +1554,9 @@ def _parse_shorts(
             if o.argcount != 0:
                 if left == "":
                     if current_token is None or current_token == "--":
-                        raise tokens.error("%s requires argument" % short)
+                        raise tokens.error(
+                            "%s requires argument" % short + tokens.where(position)
+                        )
                     else:
                         value = tokens.move()
                 else:
@@ -607,11 +1568,12 @@ def _parse_shorts(
     return parsed
 
 
-def _parse_pattern(source: str, options: list[_Option]) -> _Required:
-    tokens = _Tokens.from_pattern(source)
+def _parse_pattern(source: str | _Tokens, options: list[_Option]) -> _Required:
+    tokens = _Tokens.from_pattern(source) if isinstance(source, str) else source
     result = _parse_expr(tokens, options)
     if tokens.current() is not None:
-        raise tokens.error("unexpected ending: %r" % " ".join(tokens))
+        where = tokens.where(tokens.position)
+        raise tokens.error("unexpected ending: %r" % " ".join(tokens.rest()) + where)
     return _Required(*result)
 
 
@@ -655,12 +1617,13 @@ def _parse_atom(tokens: _Tokens, options: list[_Option]) -> list[_Pattern]:
     if not token:
         return [_Command(tokens.move())]  # pragma: no cover
     elif token in "([":
+        position = tokens.position
         tokens.move()
         matching = {"(": ")", "[": "]"}[token]
         pattern = {"(": _Required, "[": _NotRequired}[token]
         matched_pattern = pattern(*_parse_expr(tokens, options))
         if tokens.move() != matching:
-            raise tokens.error("unmatched '%s'" % token)
+            raise tokens.error("unmatched '%s'" % token + tokens.where(position))
         return [matched_pattern]
     elif token == "options":
         tokens.move()
@@ -680,6 +1643,8 @@ def _parse_argv(
     options: list[_Option],
     options_first: bool = False,
     more_magic: bool = False,
+    parsed: list[_Pattern] | None = None,
+    checkpoints: list[tuple[int, int, int]] | None = None,
 ) -> list[_Pattern]:
     """Parse command-line argument vector.
 
@@ -688,33 +1653,30 @@ def _parse_argv(
     else:
         argv ::= [ longer | shorts | argument ]* [ '--' [ argument ]* ] ;
 
+    Parsing resumes at the position of `tokens`, after the elements already
+    `parsed` from the tokens before it. The position of the tokens, the
+    number of parsed elements and the number of `options` after each step
+    are added to `checkpoints`, where parsing another argument vector with
+    the same tokens up to that position can resume, with the options that
+    unknown ones among them added to the table.
     """
 
-    def isanumber(x):
-        try:
-            float(x)
-            return True
-        except ValueError:
-            return False
-
-    parsed: list[_Pattern] = []
-    current_token = tokens.current()
-    while current_token is not None:
-        if current_token == "--":
-            return parsed + [_Argument(None, v) for v in tokens]
-        elif current_token.startswith("--"):
+    parsed = [] if parsed is None else parsed
+    kinds = tokens.kinds()
+    while tokens.position < len(kinds):
+        kind = kinds[tokens.position]
+        if kind == _DOUBLE_DASH:
+            return parsed + [_Argument(None, v) for v in tokens.rest()]
+        elif kind == _LONG or kind == _LONG_WITH_VALUE:
             parsed += _parse_longer(tokens, options, argv=True, more_magic=more_magic)
-        elif (
-            current_token.startswith("-")
-            and current_token != "-"
-            and not isanumber(current_token)
-        ):
+        elif kind == _SHORTS:
             parsed += _parse_shorts(tokens, options, more_magic=more_magic)
         elif options_first:
-            return parsed + [_Argument(None, v) for v in tokens]
+            return parsed + [_Argument(None, v) for v in tokens.rest()]
         else:
             parsed.append(_Argument(None, tokens.move()))
-        current_token = tokens.current()
+        if checkpoints is not None:
+            checkpoints.append((tokens.position, len(parsed), len(options)))
     return parsed
 
 
@@ -725,6 +1687,74 @@ class _DocSections(NamedTuple):
     after_usage: str
 
 
+_USAGE_HEADER = re.compile(r".*\busage:", flags=re.I)
+_USAGE_WORD = re.compile(r"\busage:", flags=re.I)
+_USAGE = re.compile(r"usage:", flags=re.I)
+_OPTIONS = re.compile(r"options:", flags=re.I)
+_UNINDENTED_LINE = re.compile(r"\n(?![ \t])")
+
+_LINT_OPTIONS_IN_USAGE = (
+    'Failed to parse docstring: "options:" (case-insensitive) was '
+    'found in "usage:" section. Use a blank line after the usage, or '
+    "start the next section without leading whitespace."
+)
+_LINT_MULTIPLE_USAGE = (
+    'Failed to parse docstring: More than one "usage:" '
+    "(case-insensitive) section found."
+)
+_LINT_EMPTY_USAGE = (
+    'Failed to parse docstring: "usage:" section is empty.'
+    "Check http://docopt.org/ for examples of how your doc should look."
+)
+
+
+class _ScannedDocstring(NamedTuple):
+    sections: _DocSections
+    findings: list[str]
+
+
+def _scan_docstring(docstring: str) -> _ScannedDocstring:
+    """Partition the docstring into its sections and lint it, in a single
+    forward scan.
+
+    The usage section starts on the first line containing "usage:" (as a
+    word, case-insensitive): its header runs up to the last "usage:" on that
+    line, and its body is the rest of that line plus all following lines
+    that are indented. The findings are the lint errors, most important
+    first.
+    """
+    # Searching for the plain "usage:" and checking the word boundary of each
+    # hit is much faster than searching for r"\busage:" directly.
+    usage = _USAGE.search(docstring)
+    while usage and not _USAGE_WORD.match(docstring, usage.start()):
+        usage = _USAGE.search(docstring, usage.end())
+    if not usage:
+        raise DocoptLanguageError(
+            'Failed to parse doc: "usage:" section (case-insensitive) not found. '
+            "Check http://docopt.org/ for examples of how your doc should look."
+        )
+    start = docstring.rfind("\n", 0, usage.start()) + 1
+    line_end = docstring.find("\n", usage.end())
+    if line_end == -1:
+        line_end = len(docstring)
+    header = cast(re.Match, _USAGE_HEADER.match(docstring, start, line_end))
+    body_start = header.end()
+    unindented = _UNINDENTED_LINE.search(docstring, line_end)
+    body_end = unindented.end() if unindented else len(docstring)
+    body = docstring[body_start:body_end]
+    findings = []
+    if _OPTIONS.search(body):
+        findings.append(_LINT_OPTIONS_IN_USAGE)
+    if _USAGE.search(docstring, body_start):
+        findings.append(_LINT_MULTIPLE_USAGE)
+    if body.strip() == "":
+        findings.append(_LINT_EMPTY_USAGE)
+    sections = _DocSections(
+        docstring[:start], header.group(), body, docstring[body_end:]
+    )
+    return _ScannedDocstring(sections, findings)
+
+
 def _parse_docstring_sections(docstring: str) -> _DocSections:
     """Partition the docstring into the main sections.
 
@@ -732,28 +1762,95 @@ def _parse_docstring_sections(docstring: str) -> _DocSections:
     usage section, the usage section header, the usage section body and text
     following the usage section.
     """
-    usage_pattern = r"""
-    # Any number of lines (that don't include usage:) precede the usage section
-    \A(?P<before_usage>(?:(?!.*\busage:).*\n)*)
-    # The `usage:` section header.
-    ^(?P<usage_header>.*\busage:)
-    (?P<usage_body>
-        # The first line of the body may follow the header without a line break:
-        (?:.*(?:\n|\Z))
-        # Any number of additional indented lines
-        (?:[ \t].*(?:\n|\Z))*
+    return _scan_docstring(docstring).sections
+
+
+_FLAG = re.compile(r"[ \t]*(-\S)")
+_FLAG_LINE = re.compile(r"\n[ \t]*(-\S)")
+# Finds the colon first, which is much faster than searching for "options:"
+# case-insensitively.
+_OPTIONS_HEADING = re.compile(r":(?<=(?i:options:))")
+_OPTION_TYPE = re.compile(r"\[type: (.*?)\]", flags=re.I)
+_OPTION_DEFAULT = re.compile(r"\[default: (.*)\]", flags=re.I)
+
+
+class _OptionRecord(NamedTuple):
+    short: str | None
+    longer: str | None
+    argcount: int
+    default: str | bool | None
+    type_name: str | None
+    line: int
+
+
+def _option_record(option_description: str, line: int = 1) -> _OptionRecord:
+    """Parse a single option description, which starts with the option's
+    short or long flag and runs until the next option's description."""
+    short, longer, argcount = None, None, 0
+    text = option_description.strip()
+    # The flags end at the first double space or at the end of the line.
+    end = text.find("\n")
+    end = len(text) if end == -1 else end
+    spaces = text.find("  ", 0, end)
+    if spaces == -1:
+        flags, description = text[:end], text[end:]
+    else:
+        flags, description = text[:spaces], text[spaces + 2 :]
+    for s in flags.replace(",", " ").replace("=", " ").split():
+        if s.startswith("--"):
+            longer = s
+        elif s.startswith("-"):
+            short = s
+        else:
+            argcount = 1
+    if not argcount:
+        return _OptionRecord(short, longer, 0, False, None, line)
+    typed = _OPTION_TYPE.search(description)
+    if typed:
+        description = _OPTION_TYPE.sub("", description)
+    default = _OPTION_DEFAULT.search(description)
+    return _OptionRecord(
+        short,
+        longer,
+        argcount,
+        default.group(1) if default else None,
+        typed.group(1).strip() if typed else None,
+        line,
     )
-    # Everything else
-    (?P<after_usage>(?:.|\n)*)\Z
+
+
+def _scan_options(docstring: str, first_line: int = 1) -> list[_OptionRecord]:
+    """Find the option descriptions in the help text, in a single pass.
+
+    Option descriptions begin on a new line, possibly after an "options:"
+    section heading, and can be indented with whitespace. They start with the
+    short or long flag (-x or --xxx) and run until the line of the next
+    description. Each record has the number of the line its description
+    starts on, counting from `first_line`.
     """
-    match = re.match(usage_pattern, docstring, flags=re.M | re.I | re.VERBOSE)
-    if not match:
-        raise DocoptLanguageError(
-            'Failed to parse doc: "usage:" section (case-insensitive) not found. '
-            "Check http://docopt.org/ for examples of how your doc should look."
-        )
-    before, header, body, after = match.groups()
-    return _DocSections(before, header, body, after)
+    # Map the start of each line that has a description to the start of its
+    # first flag.
+    starts = {}
+    flag = _FLAG.match(docstring)
+    if flag:
+        starts[0] = flag.start(1)
+    for flag in _FLAG_LINE.finditer(docstring):
+        starts[flag.start() + 1] = flag.start(1)
+    # A flag following an "options:" heading on the same line; the last
+    # such heading on a line wins.
+    for heading in _OPTIONS_HEADING.finditer(docstring):
+        flag = _FLAG.match(docstring, heading.end())
+        if flag:
+            starts[docstring.rfind("\n", 0, heading.start()) + 1] = flag.start(1)
+    lines = sorted(starts)
+    records = []
+    line, counted = first_line, 0
+    for line_start, end in zip(lines, [*lines[1:], len(docstring)]):
+        start = starts[line_start]
+        line += docstring.count("\n", counted, start)
+        counted = start
+        records.append(_option_record(docstring[start:end], line))
+    return records
 
 
 def _parse_options(docstring: str) -> list[_Option]:
@@ -774,40 +1871,19 @@ def _parse_options(docstring: str) -> list[_Option]:
                                 do the thing  [default: 42]
     ```
     """
-    option_start = r"""
-    # Option descriptions begin on a new line
-    ^
-    # They may occur on the same line as an options: section heading
-    (?:.*options:)?
-    # They can be indented with whitespace
-    [ \t]*
-    # The description itself starts with the short or long flag (-x or --xxx)
-    (-\S)
-    """
-    parts = re.split(option_start, docstring, flags=re.M | re.I | re.VERBOSE)[1:]
-    return [
-        _Option.parse(start + rest) for (start, rest) in zip(parts[0::2], parts[1::2])
-    ]
+    return [_Option.from_record(record) for record in _scan_options(docstring)]
 
 
-def _lint_docstring(sections: _DocSections):
-    """Report apparent mistakes in the docstring format."""
-    if re.search("options:", sections.usage_body, flags=re.I):
-        raise DocoptLanguageError(
-            'Failed to parse docstring: "options:" (case-insensitive) was '
-            'found in "usage:" section. Use a blank line after the usage, or '
-            "start the next section without leading whitespace."
-        )
-    if re.search("usage:", sections.usage_body + sections.after_usage, flags=re.I):
-        raise DocoptLanguageError(
-            'Failed to parse docstring: More than one "usage:" '
-            "(case-insensitive) section found."
-        )
-    if sections.usage_body.strip() == "":
-        raise DocoptLanguageError(
-            'Failed to parse docstring: "usage:" section is empty.'
-            "Check http://docopt.org/ for examples of how your doc should look."
-        )
+def _lint_docstring(sections: _DocSections, findings: list[str] | None = None):
+    """Report apparent mistakes in the docstring format.
+
+    `findings` are the ones `_scan_docstring` gave for these sections, if they
+    are known already.
+    """
+    if findings is None:
+        findings = _scan_docstring("".join(sections)).findings
+    if findings:
+        raise DocoptLanguageError(findings[0])
 
 
 def _formal_usage(usage: str) -> str:
@@ -816,13 +1892,18 @@ def _formal_usage(usage: str) -> str:
 
 
 def _extras(
-    default_help: bool, version: None, options: list[_Pattern], docstring: str
+    default_help: bool,
+    version: None,
+    options: list[_Pattern],
+    docstring: str | Callable[[], str],
 ) -> None:
     if default_help and any(
         (o.name in ("-h", "--help")) and o.value
         for o in options
         if isinstance(o, _Option)
     ):
+        if callable(docstring):
+            docstring = docstring()
         print(docstring.strip("\n"))
         sys.exit()
     if version and any(
@@ -832,16 +1913,1726 @@ def _extras(
         sys.exit()
 
 
+_Converter = Callable[[str], Any]
+_TYPES: dict[str, _Converter] = {"int": int, "float": float, "str": str}
+_TYPECODES: dict[_Converter, str] = {int: "q", float: "d"}
+
+
+def _converters(
+    options: list[_Option], keys: Iterable[str], types: dict[str, _Converter | str]
+) -> dict[str, _Converter]:
+    """Resolve the `[type: ...]` of option descriptions, and the `types` given
+    to the parser, into a converter for each key that has one."""
+    keys = set(keys)
+    named: dict[str, _Converter | str] = {}
+    for o in options:
+        if o.type_name and o.name is not None and o.name in keys:
+            named[o.name] = o.type_name
+    converters = {}
+    for key, converter in {**named, **types}.items():
+        if key not in keys:
+            raise DocoptLanguageError(f"{key} is not in the usage pattern.")
+        if isinstance(converter, str):
+            if converter not in _TYPES:
+                raise DocoptLanguageError(
+                    f"Unknown type {converter!r} for {key}, "
+                    f"expected one of {', '.join(_TYPES)}."
+                )
+            converter = _TYPES[converter]
+        converters[key] = converter
+    return converters
+
+
+def _convert(key: str, value: Any, converter: _Converter, packed: bool) -> Any:
+    """Convert a parsed str value, or all values of a repeated element at once.
+
+    With `packed`, repeated int and float values become `array`s.
+    """
+    if isinstance(value, str):
+        return _convert_tokens(key, [value], converter)[0]
+    if isinstance(value, list):
+        typecode = _TYPECODES.get(converter) if packed else None
+        return _convert_tokens(key, value, converter, typecode)
+    return value
+
+
+def _convert_tokens(
+    key: str, tokens: list[str], converter: _Converter, typecode: str | None = None
+) -> list[Any] | array:
+    try:
+        if typecode:
+            return array(typecode, map(converter, tokens))
+        return list(map(converter, tokens))
+    except (ValueError, TypeError, OverflowError):
+        pass
+    # Converting in bulk failed, convert one by one to find the culprit.
+    for token in tokens:
+        try:
+            converted = converter(token)
+            if typecode:
+                array(typecode, [converted])
+        except (ValueError, TypeError, OverflowError) as e:
+            raise DocoptExit(f"Invalid value for {key}: {token!r} ({e})") from None
+    raise AssertionError("unreachable")  # pragma: no cover
+
+
+def _attribute_aliases(keys: Iterable[str]) -> dict[str, str]:
+    """Map attribute names, like `foo_bar` or `host`, to keys like `--foo-bar`
+    or `<host>`. When two keys share an alias, the last one wins."""
+    aliases = {}
+    for key in keys:
+        aliases[key.lstrip("-").replace("-", "_")] = key
+        aliases[key.lstrip("<").rstrip(">")] = key
+    return aliases
+
+
 class ParsedOptions(dict):
+    # Shared by all results of a Parser, so that attribute access is a couple
+    # of dict lookups. Computed on demand for instances created elsewhere.
+    _aliases: dict[str, str] | None = None
+
     def __repr__(self):
         return "{%s}" % ",\n ".join("%r: %r" % i for i in sorted(self.items()))
 
     def __getattr__(self, name: str) -> str | bool | None:
-        return self.get(name) or {
-            name: self.get(k)
-            for k in self.keys()
-            if name in [k.lstrip("-").replace("-", "_"), k.lstrip("<").rstrip(">")]
-        }.get(name)
+        if name.startswith("__"):
+            # Let protocols like copy and pickle see that a hook is missing.
+            raise AttributeError(name)
+        if name in self:
+            return self[name]
+        aliases = self._aliases
+        if aliases is None:
+            aliases = _attribute_aliases(self)
+        key = aliases.get(name)
+        return None if key is None else self.get(key)
+
+    def __reduce__(self) -> tuple:
+        # Leave out the alias table, which is recomputed on demand.
+        return type(self), (dict(self),)
+
+
+class ParsedRecord(tuple):
+    """Base class of the result classes a `Parser` created with `slots=True`
+    generates for its docstring.
+
+    Results are tuples with one attribute per option, argument and command,
+    named like the dot access of `ParsedOptions` (`--dry-run` is `dry_run`,
+    `<host>` is `host`). Keys that don't make a valid, unique attribute name
+    are only reachable through `as_dict`.
+    """
+
+    __slots__ = ()
+    _keys: tuple[str, ...] = ()
+    _aliases: dict[str, str] | None = None
+    # Inherited from the namedtuple each generated class also derives from.
+    _make: ClassVar[Callable[[Iterable[Any]], ParsedRecord]]
+
+    def as_dict(self) -> ParsedOptions:
+        """Return the same mapping `docopt()` returns."""
+        result = ParsedOptions(zip(self._keys, self))
+        result._aliases = self._aliases
+        return result
+
+
+def _record_type(keys: tuple[str, ...], aliases: dict[str, str]) -> type[ParsedRecord]:
+    fields = [k.lstrip("-").replace("-", "_").lstrip("<").rstrip(">") for k in keys]
+    base = namedtuple("ParsedRecord", fields, rename=True)  # type: ignore[misc]
+    namespace = {"__slots__": (), "_keys": keys, "_aliases": aliases}
+    return cast(
+        "type[ParsedRecord]", type("ParsedRecord", (ParsedRecord, base), namespace)
+    )
+
+
+class _FrozenOptions(ParsedOptions):
+    """A `ParsedOptions` that can't be changed, shared by cache hits."""
+
+    def _read_only(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError("cached results are read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only  # type: ignore[assignment]
+    clear = pop = popitem = setdefault = update = _read_only  # type: ignore
+
+
+def _freeze_value(value: Any) -> Any:
+    return tuple(value) if isinstance(value, (list, array)) else value
+
+
+def _freeze_result(
+    result: ParsedOptions | ParsedRecord,
+) -> ParsedOptions | ParsedRecord:
+    """A copy of `result` with tuples for repeated values, that can't be changed."""
+    if isinstance(result, ParsedRecord):
+        return type(result)._make(map(_freeze_value, result))
+    frozen = _FrozenOptions((k, _freeze_value(v)) for k, v in result.items())
+    frozen._aliases = result._aliases
+    return frozen
+
+
+class _CachedExit(NamedTuple):
+    """The `DocoptExit` an argument vector raised, as the cache keeps it."""
+
+    code: Any
+    collected: tuple[_Pattern, ...]
+    left: tuple[_Pattern, ...]
+
+    def exit(self) -> DocoptExit:
+        """A new `DocoptExit` with the same message and elements."""
+        exit = DocoptExit.__new__(DocoptExit)
+        SystemExit.__init__(exit, self.code)
+        exit.collected, exit.left = list(self.collected), list(self.left)
+        return exit
+
+
+class CacheInfo(NamedTuple):
+    """Statistics of the result cache of a `Parser`, from `Parser.cache_info`.
+
+    `nbytes` estimates the memory the cached argument vectors and results use.
+    """
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+    nbytes: int
+
+
+def _sizeof(obj: Any) -> int:
+    """The size of `obj`, and of its items if it's a container, in bytes."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return size + sum(map(_sizeof, obj.values()))
+    if isinstance(obj, tuple):
+        return size + sum(map(sys.getsizeof, obj))
+    return size
+
+
+class _ParseCache:
+    """A bounded LRU mapping of argument vectors to frozen results, or to the
+    message, collected and left elements of the `DocoptExit` they raised."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Any, tuple[Any, int]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.nbytes = 0
+
+    def get(self, key: Any) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Any, value: Any) -> None:
+        size = _sizeof(key) + _sizeof(value)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            while len(self.entries) > self.maxsize:
+                self.nbytes -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.nbytes = 0
+
+    def info(self) -> CacheInfo:
+        with self.lock:
+            return CacheInfo(
+                self.hits, self.misses, self.maxsize, len(self.entries), self.nbytes
+            )
+
+
+class _Prefixed(NamedTuple):
+    """A parsed argument vector, with the option table it was parsed with, and
+    the checkpoints where parsing the next one of a sorted batch can resume if
+    it starts with the same tokens."""
+
+    tokens: list[str]
+    kinds: array
+    parsed: list[_Pattern]
+    shape: tuple
+    options: list[_Option]
+    checkpoints: list[tuple[int, int, int]]
+
+
+def _common_prefix(a: list[str], b: list[str]) -> int:
+    """The number of tokens `a` and `b` start with in common."""
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+class _MatchPlan(NamedTuple):
+    """How `Parser.parse_many` builds the result of an argument vector from
+    the values in it, without matching, for any argument vector of its shape.
+
+    `base` holds the values of the result that don't depend on the argument
+    vector, other than defaults. `singles` are the keys that take the value of
+    an element of the parsed argument vector, by its index, and `lists` the
+    keys that take a copy of `template`, with the value of an element at some
+    positions.
+    """
+
+    base: dict[str, Any]
+    singles: tuple[tuple[str, int], ...]
+    lists: tuple[tuple[str, list, tuple[tuple[int, int], ...]], ...]
+
+
+# The number of argument vector shapes `Parser.parse_many` keeps plans for.
+_PLAN_CACHE_SIZE = 4096
+
+
+class ParsedColumns(dict):
+    """The results of `Parser.parse_many(..., columnar=True)`, as a column of
+    values per key, with a row per argument vector.
+
+    Columns are NumPy arrays if NumPy is installed, and `array`s otherwise.
+    Flags and commands are bools (0 and 1 without NumPy) and counts are ints;
+    single values are a `StringColumn`, or a `NumberColumn` if their type is
+    int or float, and repeated values a `ListColumn`. Values of other types
+    are kept in a list. `errors` is true for the argument vectors that didn't
+    match, whose values are all empty.
+    """
+
+    errors: Any = None
+
+
+class StringColumn:
+    """Strings sliced out of a single `buffer`: row i is
+    `buffer[starts[i]:stops[i]]`, or None where `valid[i]` is false."""
+
+    __slots__ = ("buffer", "starts", "stops", "valid")
+
+    def __init__(self, buffer: str, starts: Any, stops: Any, valid: Any) -> None:
+        self.buffer, self.starts, self.stops, self.valid = buffer, starts, stops, valid
+
+    def __len__(self) -> int:
+        return len(self.valid)
+
+    def __getitem__(self, i: int) -> str | None:
+        return self.buffer[self.starts[i] : self.stops[i]] if self.valid[i] else None
+
+    def __iter__(self) -> Iterator[str | None]:
+        return map(self.__getitem__, range(len(self)))
+
+    def __repr__(self) -> str:
+        return f"StringColumn({list(self)!r})"
+
+
+class NumberColumn:
+    """Numbers: row i is `values[i]`, or None where `valid[i]` is false."""
+
+    __slots__ = ("values", "valid")
+
+    def __init__(self, values: Any, valid: Any) -> None:
+        self.values, self.valid = values, valid
+
+    def __len__(self) -> int:
+        return len(self.valid)
+
+    def __getitem__(self, i: int) -> int | float | None:
+        return self.values[i] if self.valid[i] else None
+
+    def __iter__(self) -> Iterator[int | float | None]:
+        return map(self.__getitem__, range(len(self)))
+
+    def __repr__(self) -> str:
+        return f"NumberColumn({list(self)!r})"
+
+
+class ListColumn:
+    """Repeated values: row i is the list of `values[starts[i]:stops[i]]`,
+    where `values` is a column of strings, or of numbers."""
+
+    __slots__ = ("starts", "stops", "values")
+
+    def __init__(self, starts: Any, stops: Any, values: Any) -> None:
+        self.starts, self.stops, self.values = starts, stops, values
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> list[Any]:
+        return [self.values[j] for j in range(self.starts[i], self.stops[i])]
+
+    def __iter__(self) -> Iterator[list[Any]]:
+        return map(self.__getitem__, range(len(self)))
+
+    def __repr__(self) -> str:
+        return f"ListColumn({list(self)!r})"
+
+
+def _offsets(offsets: array, size: int) -> array:
+    """`offsets` as 32-bit ints, which hold offsets into smaller buffers."""
+    return array("i", offsets) if size < 2**31 else offsets
+
+
+def _column_array(
+    values: array, numpy: Any, take: array | None, dtype: type | None = None
+) -> Any:
+    """`values` as a NumPy array of `dtype` if `numpy` is given, reordered so
+    that row i is `values[take[i]]` if `take` is given."""
+    if numpy is not None:
+        column = numpy.asarray(values)
+        if dtype is bool:
+            column = column.view(numpy.bool_)
+        return column if take is None else column[numpy.asarray(take)]
+    if take is None:
+        return values
+    return array(values.typecode, [values[j] for j in take])
+
+
+class _ArrayBuilder:
+    __slots__ = ("values", "dtype")
+
+    def __init__(self, typecode: str, dtype: type | None = None) -> None:
+        self.values, self.dtype = array(typecode), dtype
+
+    def add(self, value: Any) -> None:
+        self.values.append(value)
+
+    def skip(self) -> None:
+        self.values.append(0)
+
+    def build(self, numpy: Any, take: array | None) -> Any:
+        return _column_array(self.values, numpy, take, self.dtype)
+
+
+class _NumberBuilder:
+    __slots__ = ("values", "valid")
+
+    def __init__(self, typecode: str) -> None:
+        self.values, self.valid = array(typecode), array("B")
+
+    def add(self, value: Any) -> None:
+        self.values.append(0 if value is None else value)
+        self.valid.append(value is not None)
+
+    def skip(self) -> None:
+        self.add(None)
+
+    def build(self, numpy: Any, take: array | None) -> NumberColumn:
+        return NumberColumn(
+            _column_array(self.values, numpy, take),
+            _column_array(self.valid, numpy, take, bool),
+        )
+
+
+class _StringBuilder:
+    __slots__ = ("parts", "size", "starts", "stops", "valid")
+
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+        self.size = 0
+        self.starts, self.stops, self.valid = array("q"), array("q"), array("B")
+
+    def add(self, value: str | None) -> None:
+        self.starts.append(self.size)
+        if value is not None:
+            self.parts.append(value)
+            self.size += len(value)
+        self.stops.append(self.size)
+        self.valid.append(value is not None)
+
+    def skip(self) -> None:
+        self.add(None)
+
+    def build(self, numpy: Any, take: array | None) -> StringColumn:
+        buffer = "".join(self.parts)
+        self.parts = []
+        return StringColumn(
+            buffer,
+            _column_array(_offsets(self.starts, self.size), numpy, take),
+            _column_array(_offsets(self.stops, self.size), numpy, take),
+            _column_array(self.valid, numpy, take, bool),
+        )
+
+
+class _ListBuilder:
+    __slots__ = ("items", "size", "starts", "stops")
+
+    def __init__(self, items: _ArrayBuilder | _StringBuilder | _ObjectBuilder):
+        self.items, self.size = items, 0
+        self.starts, self.stops = array("q"), array("q")
+
+    def add(self, values: Iterable[Any]) -> None:
+        self.starts.append(self.size)
+        for value in values:
+            self.items.add(value)
+            self.size += 1
+        self.stops.append(self.size)
+
+    def skip(self) -> None:
+        self.add(())
+
+    def build(self, numpy: Any, take: array | None) -> ListColumn:
+        return ListColumn(
+            _column_array(_offsets(self.starts, self.size), numpy, take),
+            _column_array(_offsets(self.stops, self.size), numpy, take),
+            self.items.build(numpy, None),
+        )
+
+
+class _ObjectBuilder:
+    __slots__ = ("values",)
+
+    def __init__(self) -> None:
+        self.values: list[Any] = []
+
+    def add(self, value: Any) -> None:
+        self.values.append(value)
+
+    def skip(self) -> None:
+        self.values.append(None)
+
+    def build(self, numpy: Any, take: array | None) -> list[Any]:
+        return self.values if take is None else [self.values[j] for j in take]
+
+
+def _column_builder(default: Any, converter: _Converter | None) -> Any:
+    """A builder of the column of a key with this default and converter."""
+    if type(default) is bool:
+        return _ArrayBuilder("B", bool)
+    if type(default) is int:
+        return _ArrayBuilder("q")
+    typecode = _TYPECODES.get(converter) if converter else None
+    if type(default) is list:
+        if typecode:
+            return _ListBuilder(_ArrayBuilder(typecode))
+        if converter in (None, str):
+            return _ListBuilder(_StringBuilder())
+        return _ListBuilder(_ObjectBuilder())
+    if typecode:
+        return _NumberBuilder(typecode)
+    if converter in (None, str):
+        return _StringBuilder()
+    return _ObjectBuilder()
+
+
+class _Element(NamedTuple):
+    """A group of usage pattern elements, built by `Grammar.either` and co."""
+
+    kind: type
+    elements: tuple[str | _Element, ...]
+
+
+class Grammar:
+    """Build a command-line interface without writing its docstring.
+
+    Options are declared with `option` (or many at once with `options`),
+    and each `usage` call adds a usage pattern, made of elements. An element
+    is a str written like in a docstring's usage section ("add", "<file>",
+    "--force", "[-v | -q]", ...), or a group built by `either`, `optional`,
+    `required` or `repeat`. Pass the grammar to `Parser` to compile it; the
+    parser behaves exactly like one built from the docstring `render`
+    returns, without parsing it.
+
+    Example
+    -------
+    >>> grammar = Grammar("prog")
+    >>> grammar.option("-v", "--verbose", help="Be verbose.")
+    >>> grammar.option("-n", "--number", argcount=1, default="3", type="int")
+    >>> grammar.usage(Grammar.optional("options"), "add", Grammar.repeat("<file>"))
+    >>> grammar.usage("rm", Grammar.either("--force", "--dry-run"))
+    >>> Parser(grammar).parse(["add", "-n", "5", "a.txt"])
+    """
+
+    def __init__(self, program: str) -> None:
+        self.program = program
+        self._options: list[_OptionRecord] = []
+        self._help: list[str] = []
+        self._usages: list[tuple[str | _Element, ...]] = []
+
+    def copy(self) -> Grammar:
+        grammar = Grammar(self.program)
+        grammar._options = self._options.copy()
+        grammar._help = self._help.copy()
+        grammar._usages = self._usages.copy()
+        return grammar
+
+    def option(
+        self,
+        short: str | None = None,
+        long: str | None = None,
+        argcount: int = 0,
+        default: str | None = None,
+        help: str = "",
+        type: str | None = None,
+    ) -> None:
+        """Declare an option, like a line of the "options:" section would.
+
+        `default` and `type` only apply to options that take an argument,
+        and `type` is one of the names `[type: ...]` accepts.
+        """
+        if not short and not long:
+            raise DocoptLanguageError("An option needs a short or a long name.")
+        if argcount not in (0, 1):
+            raise DocoptLanguageError(f"{short or long} must have 0 or 1 arguments.")
+        if argcount:
+            record = _OptionRecord(short, long, 1, default, type, 0)
+        else:
+            record = _OptionRecord(short, long, 0, False, None, 0)
+        self._options.append(record)
+        self._help.append(help)
+
+    def options(self, options: Iterable[tuple | dict[str, Any]]) -> None:
+        """Declare many options: each one is a tuple of the positional
+        arguments of `option`, or a dict of its keyword arguments."""
+        for option in options:
+            if isinstance(option, dict):
+                self.option(**option)
+            else:
+                self.option(*option)
+
+    def usage(self, *elements: str | _Element) -> None:
+        """Add a usage pattern, which is the program name followed by
+        `elements`."""
+        self._usages.append(elements)
+
+    def usages(self, usages: Iterable[Iterable[str | _Element]]) -> None:
+        """Add many usage patterns, each one given as its elements."""
+        self._usages.extend(tuple(elements) for elements in usages)
+
+    @staticmethod
+    def either(*alternatives: str | _Element) -> _Element:
+        """Exactly one of `alternatives`, like `(a | b)`."""
+        return _Element(_Either, alternatives)
+
+    @staticmethod
+    def optional(*elements: str | _Element) -> _Element:
+        """`elements`, which may be left out, like `[a b]`."""
+        return _Element(_NotRequired, elements)
+
+    @staticmethod
+    def required(*elements: str | _Element) -> _Element:
+        """`elements` grouped together, like `(a b)`."""
+        return _Element(_Required, elements)
+
+    @staticmethod
+    def repeat(*elements: str | _Element) -> _Element:
+        """`elements`, one or more times, like `a...` or `(a b)...`."""
+        return _Element(_OneOrMore, elements)
+
+    def compile(self) -> tuple[list[_Option], _Required]:
+        """Build the option table and the pattern tree, as `Parser` would
+        from the docstring `render` returns."""
+        options = [_Option.from_record(record) for record in self._options]
+        lines = self._lines(options) or [_Required()]
+        if len(lines) > 1:
+            return options, _Required(_Either(*lines))
+        return options, _Required(*lines)
+
+    def _lines(self, options: list[_Option]) -> list[_Required]:
+        """The pattern of each usage line, resolved against `options`."""
+        return [
+            _Required(*self._sequence(elements, options)) for elements in self._usages
+        ]
+
+    def _sequence(
+        self, elements: Iterable[str | _Element], options: list[_Option]
+    ) -> list[_Pattern]:
+        return [
+            pattern
+            for element in elements
+            for pattern in self._patterns(element, options)
+        ]
+
+    def _expression(self, element: _Element, options: list[_Option]) -> list[_Pattern]:
+        """The patterns of what is inside the brackets of a group: a single
+        `either` is written without brackets of its own, as in `[a | b]`."""
+        if len(element.elements) == 1 and _is_either(element.elements[0]):
+            alternatives = [
+                self._sequence([alternative], options)
+                for alternative in cast(_Element, element.elements[0]).elements
+            ]
+            if len(alternatives) == 1:
+                return alternatives[0]
+            return [
+                _Either(
+                    *(
+                        _Required(*patterns) if len(patterns) > 1 else patterns[0]
+                        for patterns in alternatives
+                    )
+                )
+            ]
+        return self._sequence(element.elements, options)
+
+    def _patterns(
+        self, element: str | _Element, options: list[_Option]
+    ) -> list[_Pattern]:
+        if isinstance(element, str):
+            if _is_atom(element):
+                return _parse_atom(_Tokens([element], DocoptLanguageError), options)
+            patterns = _parse_pattern(element, options).children
+            return [_Required(*patterns)] if "|" in element else patterns
+        if element.kind is _OneOrMore:
+            single = element.elements[0] if len(element.elements) == 1 else None
+            if isinstance(single, str) and _is_atom(single):
+                return [_OneOrMore(*self._patterns(single, options))]
+            if isinstance(single, _Element) and not _is_either(single):
+                return [_OneOrMore(*self._patterns(single, options))]
+            return [_OneOrMore(_Required(*self._expression(element, options)))]
+        if element.kind is _Either:
+            element = _Element(_Required, (element,))
+        return [element.kind(*self._expression(element, options))]
+
+    def render_usage(self) -> str:
+        """Render the usage section."""
+        lines = [
+            " ".join([self.program, *map(_render_element, elements)])
+            for elements in self._usages or [()]
+        ]
+        return "Usage:\n" + "".join(f"  {line}\n" for line in lines)
+
+    def render(self) -> str:
+        """Render the docstring this grammar describes."""
+        options = [
+            _render_option(record, help_text)
+            for record, help_text in zip(self._options, self._help)
+        ]
+        if not options:
+            return self.render_usage()
+        return self.render_usage() + "\nOptions:\n" + "".join(options)
+
+
+def _render_option(record: _OptionRecord, help_text: str = "") -> str:
+    """The line of the "options:" section that describes `record`."""
+    value = " <value>" if record.argcount else ""
+    flags = [f"{record.short}{value}"] if record.short else []
+    if record.longer:
+        flags.append(f"{record.longer}{value.replace(' ', '=')}")
+    # Continuation lines are indented, so they can't start an option.
+    description = "\n      ".join(help_text.splitlines())
+    if record.argcount and record.default is not None:
+        description += f" [default: {record.default}]"
+    if record.type_name:
+        description += f" [type: {record.type_name}]"
+    line = f"  {', '.join(flags)}  {description.strip()}"
+    return line.rstrip() + "\n"
+
+
+def _is_atom(element: str) -> bool:
+    """Whether `element` is a single usage pattern token."""
+    return bool(element) and not (
+        _PATTERN_SPECIAL.search(element) or _WHITESPACE.search(element)
+    )
+
+
+def _is_either(element: str | _Element) -> bool:
+    return isinstance(element, _Element) and element.kind is _Either
+
+
+def _render_element(element: str | _Element) -> str:
+    if isinstance(element, str):
+        return f"({element})" if "|" in element else element
+    if element.kind is _OneOrMore:
+        single = element.elements[0] if len(element.elements) == 1 else None
+        if isinstance(single, str) and _is_atom(single):
+            return f"{single}..."
+        if isinstance(single, _Element) and not _is_either(single):
+            return f"{_render_element(single)}..."
+        return f"({_render_inside(element)})..."
+    if element.kind is _NotRequired:
+        return f"[{_render_inside(element)}]"
+    if element.kind is _Either:
+        element = _Element(_Required, (element,))
+    return f"({_render_inside(element)})"
+
+
+def _render_inside(element: _Element) -> str:
+    if len(element.elements) == 1 and _is_either(element.elements[0]):
+        alternatives = cast(_Element, element.elements[0]).elements
+        return " | ".join(map(_render_element, alternatives))
+    return " ".join(map(_render_element, element.elements))
+
+
+_IR_VERSION = 1
+_IR_KINDS: dict[type, str] = {
+    _Required: "required",
+    _NotRequired: "optional",
+    _OptionsShortcut: "options",
+    _Either: "either",
+    _OneOrMore: "one_or_more",
+}
+_IR_BRANCHES = {kind: branch for branch, kind in _IR_KINDS.items()}
+
+
+def _encode_leaf(leaf: _LeafPattern) -> list[Any]:
+    if isinstance(leaf, _Option):
+        return [
+            "option",
+            leaf.short,
+            leaf.longer,
+            leaf.argcount,
+            leaf.value,
+            leaf.type_name,
+        ]
+    return ["command" if type(leaf) is _Command else "argument", leaf.name, leaf.value]
+
+
+def _decode_leaf(encoded: list[Any]) -> _LeafPattern:
+    leaf: _LeafPattern
+    if encoded[0] == "option":
+        _, short, longer, argcount, value, type_name = encoded
+        leaf = _Option(short, longer, argcount)
+        leaf.type_name = type_name
+    elif encoded[0] == "command":
+        _, name, value = encoded
+        leaf = _Command(name)
+    elif encoded[0] == "argument":
+        _, name, value = encoded
+        leaf = _Argument(name)
+    else:
+        raise DocoptLanguageError(f"Unknown kind of element {encoded[0]!r}.")
+    leaf.value = value
+    return leaf
+
+
+def _decode_pattern(encoded: Any, leaves: list[_LeafPattern]) -> _Pattern:
+    if isinstance(encoded, int):
+        return leaves[encoded]
+    kind, children = encoded
+    branch = _IR_BRANCHES.get(kind)
+    if branch is None:
+        raise DocoptLanguageError(f"Unknown kind of group {kind!r}.")
+    return branch(*[_decode_pattern(child, leaves) for child in children])
+
+
+def _pattern_options(pattern: _BranchPattern) -> list[_Option]:
+    """The options of `pattern` outside of its [options] shortcuts."""
+    found = []
+    stack: list[_Pattern] = [pattern]
+    while stack:
+        node = stack.pop()
+        if type(node) is _Option:
+            found.append(node)
+        elif isinstance(node, _BranchPattern) and type(node) is not _OptionsShortcut:
+            stack += node.children
+    return found
+
+
+def _option_records(part: str | Grammar) -> list[_OptionRecord]:
+    """The options a docstring, fragment or grammar describes, leaving out the
+    ones only its usage lines name."""
+    if isinstance(part, Grammar):
+        return list(part._options)
+    if not _USAGE_WORD.search(part):
+        return _scan_options(part)
+    sections, _ = _scan_docstring(part)
+    return [
+        *_scan_options(sections.before_usage),
+        *_scan_options(sections.after_usage),
+    ]
+
+
+class Parser:
+    """A command-line interface compiled from its docstring.
+
+    The docstring is parsed once, when the `Parser` is created, and the
+    resulting pattern is reused by every call to `parse`. `docopt()` is a
+    shortcut for creating a `Parser` and parsing a single argument vector
+    with it; create the `Parser` yourself to parse many.
+
+    A `Grammar` can be given instead of the docstring, in which case no text
+    is parsed at all, and the help text is only rendered if it is printed.
+
+    With `cache_size`, the results of the last `cache_size` distinct argument
+    vectors are kept, including the `DocoptExit` they raise, and parsing the
+    same argument vector again returns the same read-only result. The cache is
+    safe to use from several threads; `cache_info` reports its hit rate and an
+    estimate of its memory use.
+    """
+
+    def __init__(
+        self,
+        docstring: str | Grammar,
+        default_help: bool = True,
+        version: Any = None,
+        options_first: bool = False,
+        slots: bool = False,
+        types: dict[str, _Converter | str] | None = None,
+        packed: bool = False,
+        cache_size: int = 0,
+    ) -> None:
+        self.default_help = default_help
+        self.version = version
+        self.options_first = options_first
+        self.slots = slots
+        self.packed = packed
+        self._cache = _ParseCache(cache_size) if cache_size > 0 else None
+        self._docstring: str | None = None
+        if isinstance(docstring, Grammar):
+            # Later changes to the grammar don't affect this parser.
+            grammar = docstring.copy()
+            self._help: list[str | Grammar] = [grammar]
+            self.usage = grammar.render_usage()
+            options, pattern = grammar.compile()
+        else:
+            sections, findings = _scan_docstring(docstring)
+            _lint_docstring(sections, findings)
+            self._docstring = docstring
+            self._help = [docstring]
+            self.usage = sections.usage_header + sections.usage_body
+            options = [
+                *_parse_options(sections.before_usage),
+                *_parse_options(sections.after_usage),
+            ]
+            body_start = len(sections.before_usage) + len(sections.usage_header)
+            body_end = body_start + len(sections.usage_body)
+            pattern = _parse_pattern(
+                _lex_usage(docstring, body_start, body_end), options
+            )
+        index = _index(pattern)
+        pattern_options = set(index.leaves.get(_Option, ()))
+        for options_shortcut in index.shortcuts:
+            options_shortcut.children = [
+                opt for opt in options if opt not in pattern_options
+            ]
+        # The options written in the usage patterns themselves, which are the
+        # ones left out of [options].
+        self._pattern_options = {opt._identity() for opt in pattern_options}
+        # Fixing the pattern changes the values of its options, which can be
+        # the ones in `options`, so their defaults are kept for `merge`.
+        self._option_defaults = {opt._identity(): opt.value for opt in options}
+        self._load(options, cast(_Required, pattern.fix()), types)
+
+    def _load(
+        self,
+        options: list[_Option],
+        pattern: _Required,
+        types: dict[str, _Converter | str] | None,
+        keys: Iterable[str] | None = None,
+    ) -> None:
+        """Index the fixed `pattern`, for parsing with it. Results list the
+        elements in the order of `keys`, if given."""
+        self._options = options
+        self._pattern = pattern
+        self._first_index = _FirstIndex(_usage_lines(pattern))
+        index = _index(pattern)
+        self._defaults = index.defaults
+        if keys is not None:
+            self._defaults = {key: self._defaults[key] for key in keys}
+        self._shortcuts = list(index.shortcuts)
+        # The tips of the pattern by identity, and whether a usage line repeats
+        # its [options], which `merge` works out when it first needs them.
+        self._tips: dict[tuple, _LeafPattern] | None = None
+        self._repeated_shortcuts: bool | None = None if self._shortcuts else False
+        # Defaults come from the pattern itself, so mutable ones are copied to
+        # keep callers from changing what later parses return.
+        self._mutable_defaults = tuple(
+            k for k, v in self._defaults.items() if isinstance(v, list)
+        )
+        self._keys = tuple(self._defaults)
+        self._aliases = _attribute_aliases(self._keys)
+        self._types = types or {}
+        self._converters = _converters(options, self._keys, self._types)
+        self._record_type: type[ParsedRecord] | None = None
+        self._frozen = False
+        # How `parse_many` matches each shape of argument vector, once needed.
+        self._plans: _ParseCache | None = None
+        self._command_words: dict[str, tuple[str]] = {}
+        # The matcher the pattern needs, selected when first used, and the
+        # program of its usage lines, compiled when first used.
+        self._engine: str | None = None
+        self._matcher: _DeterministicMatcher | None = None
+        self._program: _Program | None = None
+
+    def to_ir(self) -> dict[str, Any]:
+        """Return the compiled grammar as JSON-compatible data.
+
+        `Parser.from_ir` loads it back without parsing any text, in this or
+        in another process. The data is a dict with these keys:
+
+        - "docopt_ir": the version of the format, currently 1.
+        - "usage" and "help": the usage section and the whole help text.
+        - "leaves": each distinct tip of the pattern tree and of the option
+          table, as `["argument", name, value]`, `["command", name, value]`
+          or `["option", short, long, argcount, value, type]`. Tips that
+          are the same object are listed once.
+        - "options": the option table, as indexes into "leaves".
+        - "option_defaults": the default value of each option in the table.
+        - "pattern": the fixed pattern tree. A tip is its index into
+          "leaves", and a group is `[kind, children]`, with kind one of
+          "required", "optional", "options", "either" or "one_or_more".
+        - "keys": the names of the elements, in the order results list them.
+        - "program": the usage lines compiled for matching, as the lists
+          "code", "entries", "names" and "hows" of ints and names. It is
+          compiled again from "pattern" if left out.
+
+        The runtime settings given to `Parser`, such as `types`, aren't
+        part of it, and are given to `from_ir` instead.
+        """
+        leaves: list[list[Any]] = []
+        numbers: dict[int, int] = {}
+
+        def leaf(node: _LeafPattern) -> int:
+            number = numbers.get(id(node))
+            if number is None:
+                number = numbers[id(node)] = len(leaves)
+                leaves.append(_encode_leaf(node))
+            return number
+
+        def encode(node: _Pattern) -> Any:
+            if isinstance(node, _BranchPattern):
+                return [_IR_KINDS[type(node)], [encode(c) for c in node.children]]
+            return leaf(cast(_LeafPattern, node))
+
+        pattern = encode(self._pattern)
+        return {
+            "docopt_ir": _IR_VERSION,
+            "usage": self.usage,
+            "help": self.docstring,
+            "leaves": leaves,
+            "options": [leaf(opt) for opt in self._options],
+            "option_defaults": [
+                self._option_defaults[opt._identity()] for opt in self._options
+            ],
+            "pattern": pattern,
+            "keys": list(self._keys),
+            "program": self._compiled_program().encode(),
+        }
+
+    @classmethod
+    def from_ir(
+        cls,
+        ir: dict[str, Any] | str,
+        default_help: bool = True,
+        version: Any = None,
+        options_first: bool = False,
+        slots: bool = False,
+        types: dict[str, _Converter | str] | None = None,
+        packed: bool = False,
+        cache_size: int = 0,
+    ) -> Parser:
+        """Load a parser from the data `to_ir` returned, or its JSON text.
+
+        The other arguments are the ones of `Parser`. The parser is the same
+        as the one `to_ir` was called on, without parsing its docstring.
+        """
+        if isinstance(ir, str):
+            ir = json.loads(ir)
+        ir = cast(Dict[str, Any], ir)
+        if ir.get("docopt_ir") != _IR_VERSION:
+            raise DocoptLanguageError(
+                f"Unsupported grammar version {ir.get('docopt_ir')!r}, "
+                f"expected {_IR_VERSION}."
+            )
+        parser = cls.__new__(cls)
+        parser.default_help = default_help
+        parser.version = version
+        parser.options_first = options_first
+        parser.slots = slots
+        parser.packed = packed
+        parser._cache = _ParseCache(cache_size) if cache_size > 0 else None
+        parser._docstring = ir["help"]
+        parser._help = [ir["help"]]
+        parser.usage = ir["usage"]
+        leaves = [_decode_leaf(encoded) for encoded in ir["leaves"]]
+        options = [cast(_Option, leaves[number]) for number in ir["options"]]
+        parser._option_defaults = {
+            opt._identity(): value for opt, value in zip(options, ir["option_defaults"])
+        }
+        pattern = cast(_Required, _decode_pattern(ir["pattern"], leaves))
+        parser._pattern_options = {opt._identity() for opt in _pattern_options(pattern)}
+        parser._load(options, pattern, types, ir["keys"])
+        if "program" in ir:
+            parser._program = _Program.decode(ir["program"])
+        return parser
+
+    @property
+    def docstring(self) -> str:
+        """The docstring, rendered from the grammar if there is one."""
+        if self._docstring is None:
+            self._docstring = "\n".join(
+                part if isinstance(part, str) else part.render() for part in self._help
+            )
+        return self._docstring
+
+    def merge(self, fragment: str | Grammar) -> None:
+        """Extend the interface with the options and usage lines of `fragment`.
+
+        `fragment` is a docstring, or a `Grammar`, as would be given to
+        `Parser`; it can leave out the usage section to only add options. Its
+        usage lines become new alternatives of the usage pattern, and are
+        resolved against the options of both. Only the new lines are compiled,
+        and the existing [options] shortcuts are updated in place, so merging
+        many fragments into a parser costs about as much as compiling their
+        combined docstring once. Options described again the same way are
+        ignored, and the parser is left unchanged if `fragment` is invalid.
+        If `fragment` describes an option that the usage lines so far name
+        without a description, the parser is compiled again instead, with that
+        description, as the combined docstring would be.
+
+        Example
+        -------
+        >>> parser = Parser(__doc__)
+        >>> parser.merge(plugin.__doc__)
+        """
+        if self._frozen:
+            raise TypeError("a frozen Parser can't be merged into")
+        options = list(self._options)
+        try:
+            if isinstance(fragment, Grammar):
+                fragment = fragment.copy()
+                records = [_Option.from_record(r) for r in fragment._options]
+                _add_options(options, records)
+                lines: list[_Pattern] = list(fragment._lines(options))
+                # The lines of the rendered usage section, without its header.
+                usage = fragment.render_usage().partition("\n")[2]
+            elif _USAGE_WORD.search(fragment):
+                sections, findings = _scan_docstring(fragment)
+                _lint_docstring(sections, findings)
+                _add_options(options, _parse_options(sections.before_usage))
+                _add_options(options, _parse_options(sections.after_usage))
+                body_start = len(sections.before_usage) + len(sections.usage_header)
+                body_end = body_start + len(sections.usage_body)
+                pattern = _parse_pattern(
+                    _lex_usage(fragment, body_start, body_end), options
+                )
+                lines = _usage_lines(pattern)
+                usage = sections.usage_body
+            else:
+                _add_options(options, _parse_options(fragment))
+                lines, usage = [], ""
+        except DocoptLanguageError as error:
+            if not self._describes_named(fragment):
+                raise
+            self._recompile(fragment, error)
+            return
+        added = options[len(self._options) :]
+        option_defaults = {
+            **self._option_defaults,
+            **{opt._identity(): opt.value for opt in added},
+        }
+        new = _index(_Required(*lines))
+        new_proper = {opt._identity() for opt in new.leaves.get(_Option, ())}
+        # The existing options that aren't in the usage lines yet are the ones
+        # in the [options] shortcuts.
+        leaving = {
+            identity
+            for identity in new_proper - self._pattern_options
+            if identity in self._option_defaults
+        }
+        pattern_options = self._pattern_options | new_proper
+        # The new options that aren't in any usage line join the existing
+        # shortcuts.
+        joining = [
+            opt
+            for opt in added
+            if self._shortcuts and opt._identity() not in pattern_options
+        ]
+        # Work out the new keys and converters before changing anything, so
+        # an unknown type leaves the parser as it was.
+        shortcut_options = [
+            opt for opt in options if opt._identity() not in pattern_options
+        ]
+        names = [*new.defaults, *(cast(str, opt.name) for opt in joining)]
+        if new.shortcuts:
+            names += [cast(str, opt.name) for opt in shortcut_options]
+        keys = self._keys + tuple(
+            dict.fromkeys(name for name in names if name not in self._defaults)
+        )
+        converters = _converters(options, keys, self._types)
+        for options_shortcut in new.shortcuts:
+            options_shortcut.children = list(shortcut_options)
+        # Tips equal to ones of the existing pattern become the same objects,
+        # as fix_identities would have made them.
+        if self._tips is None:
+            self._tips = {
+                leaf._identity(): leaf
+                for leaves in _index(self._pattern).leaves.values()
+                for leaf in leaves
+            }
+        tips = dict(self._tips)
+        # Options of the new lines start from their defaults. The ones leaving
+        # the shortcuts are replaced, as their values were fixed for those.
+        for opt in new.leaves.get(_Option, ()):
+            opt.value = option_defaults[opt._identity()]
+        for identity in leaving:
+            tips.pop(identity, None)
+        for line in lines:
+            _canonicalize(cast(_BranchPattern, line), tips)
+        _Either(*lines).fix_repeating_arguments()
+        # As the shortcuts are all alike, the options joining them are repeated
+        # if any usage line repeats its shortcuts.
+        joining = [tips.setdefault(opt._identity(), opt) for opt in joining]
+        if joining and self._repeated_shortcuts is None:
+            self._repeated_shortcuts = _repeats_shortcuts(self._pattern)
+        if joining and self._repeated_shortcuts:
+            _Either(_OneOrMore(*joining)).fix_repeating_arguments()
+        defaults = _index(_Required(*lines)).defaults
+        defaults.update((cast(str, opt.name), opt.value) for opt in joining)
+        for options_shortcut in self._shortcuts:
+            if leaving:
+                options_shortcut.children = [
+                    opt
+                    for opt in options_shortcut.children
+                    if opt._identity() not in leaving
+                ]
+            options_shortcut.children += joining
+        if lines:
+            self._pattern.children = [_Either(*_usage_lines(self._pattern), *lines)]
+            self._first_index.extend(lines)
+        if new.shortcuts and self._repeated_shortcuts is not True:
+            if _repeats_shortcuts(_Either(*lines)):
+                self._repeated_shortcuts = True
+            elif not self._shortcuts:
+                self._repeated_shortcuts = False
+        self._shortcuts += new.shortcuts
+        self._tips = tips
+        self._defaults.update(defaults)
+        self._mutable_defaults = tuple(
+            k for k, v in self._defaults.items() if isinstance(v, list)
+        )
+        self._aliases.update(_attribute_aliases(keys[len(self._keys) :]))
+        # The keys follow the order of the defaults, which results are built
+        # from.
+        self._keys = tuple(self._defaults)
+        self._converters = converters
+        self._record_type = None
+        self._pattern_options = pattern_options
+        self._option_defaults = option_defaults
+        self._options = options
+        if lines:
+            self.usage = self.usage.rstrip() + "".join(
+                f"\n  {line.strip()}" for line in usage.splitlines() if line.strip()
+            )
+        self._help.append(fragment)
+        self._docstring = None
+        # Cached results and plans may no longer be how the merged interface
+        # parses, nor its pattern deterministic.
+        self.cache_clear()
+        self._plans = None
+        self._engine = None
+        self._matcher = None
+        self._program = None
+
+    def _describes_named(self, fragment: str | Grammar) -> bool:
+        """Whether `fragment` describes an option differently from how the
+        usage lines merged so far name it, without a description of it."""
+        described = {
+            _Option.from_record(record)._identity()
+            for part in self._help
+            for record in _option_records(part)
+        }
+        named: dict[str | None, tuple] = {
+            name: opt._identity()
+            for opt in self._options
+            if opt._identity() not in described
+            for name in (opt.short, opt.longer)
+            if name is not None
+        }
+        for record in _option_records(fragment):
+            identity = _Option.from_record(record)._identity()
+            for name in (record.short, record.longer):
+                if named.get(name, identity) != identity:
+                    return True
+        return False
+
+    def _recompile(self, fragment: str | Grammar, error: DocoptLanguageError) -> None:
+        """Merge `fragment` by compiling the first docstring or grammar again,
+        with the options that the later ones describe, and merging the later
+        ones into it. The usage lines then name the described options, as they
+        would in the combined docstring. `error` is raised if that fails."""
+        parts = [*self._help, fragment]
+        first = parts[0]
+        known = {_Option.from_record(r)._identity() for r in _option_records(first)}
+        later: dict[tuple, _OptionRecord] = {}
+        for part in parts[1:]:
+            for record in _option_records(part):
+                identity = _Option.from_record(record)._identity()
+                if identity not in known:
+                    later.setdefault(identity, record)
+        if isinstance(first, Grammar):
+            first = first.copy()
+            first._options += later.values()
+            first._help += [""] * len(later)
+        elif later:
+            rendered = "".join(map(_render_option, later.values()))
+            first = f"{first.rstrip()}\n\nOptions:\n{rendered}"
+        try:
+            parser = Parser(
+                first,
+                self.default_help,
+                self.version,
+                self.options_first,
+                self.slots,
+                self._types,
+                self.packed,
+            )
+            for part in parts[1:]:
+                parser.merge(part)
+        except DocoptLanguageError:
+            raise error from None
+        cache = self._cache
+        vars(self).update(vars(parser))
+        self._cache = cache
+        self._help = parts
+        self._docstring = None
+        self.cache_clear()
+
+    def freeze(self) -> None:
+        """Make the compiled grammar immutable, to share it with forked workers.
+
+        Parsing never writes to the grammar, but some attributes of the parser
+        are computed when first used; they are computed now instead, and the
+        groups of the pattern become tuples. Memory pages a pre-fork server
+        shares with its workers stay shared as long as nothing writes to them,
+        so freeze the parser and then call `gc.freeze()` before forking, which
+        keeps the garbage collector of the workers from touching it. A frozen
+        parser can't be merged into.
+
+        Example
+        -------
+        >>> parser = Parser(__doc__)
+        >>> parser.freeze()
+        >>> gc.freeze()
+        >>> pid = os.fork()
+        """
+        self.docstring
+        self.record_type
+        self.engine
+        self._compiled_program()
+        if self._plans is None:
+            self._start_plans()
+        stack: list[_Pattern] = [self._pattern]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, _BranchPattern) and isinstance(node.children, list):
+                node.children = tuple(node.children)  # type: ignore[assignment]
+                stack += node.children
+        self._options = tuple(self._options)  # type: ignore[assignment]
+        self._shortcuts = tuple(self._shortcuts)  # type: ignore[assignment]
+        self._tips = None
+        self._frozen = True
+
+    @property
+    def record_type(self) -> type[ParsedRecord]:
+        """The `ParsedRecord` subclass generated for this docstring."""
+        if self._record_type is None:
+            self._record_type = _record_type(self._keys, self._aliases)
+        return self._record_type
+
+    @property
+    def engine(self) -> str:
+        """The matcher selected for the grammar: "deterministic" if each choice
+        it makes can be made from the next positional argument, or from the
+        options given, or "general" if it can take backtracking.
+
+        The deterministic matcher goes through the argument vector once and
+        sets the values of the result as it goes. The general one still
+        reports why an argument vector doesn't match, and matches the ones
+        that would take backtracking.
+        """
+        if self._engine is None:
+            lines = [_deterministic(line) for line in self._first_index.lines]
+            if None in lines:
+                self._engine = "general"
+            else:
+                self._matcher = _DeterministicMatcher(lines)  # type: ignore[arg-type]
+                self._engine = "deterministic"
+        return self._engine
+
+    def parse(
+        self, argv: list[str] | str | None = None
+    ) -> ParsedOptions | ParsedRecord:
+        """Parse `argv`, or sys.argv[1:] if it is not provided.
+
+        With a `cache_size`, results are read-only and repeated values are
+        tuples, since they are shared by every parse of the same `argv`.
+        """
+        argv = sys.argv[1:] if argv is None else argv
+        if self._cache is None:
+            return self._parse(argv)
+        key = argv if isinstance(argv, str) else tuple(argv)
+        entry = self._cache.get(key)
+        if entry is None:
+            try:
+                entry = _freeze_result(self._parse(argv))
+            except DocoptExit as e:
+                entry = _CachedExit(e.code, tuple(e.collected), tuple(e.left))
+            self._cache.put(key, entry)
+        if isinstance(entry, _CachedExit):
+            DocoptExit.usage = self.usage
+            raise entry.exit()
+        return entry
+
+    def cache_info(self) -> CacheInfo:
+        """Hits, misses and size of the result cache, see `cache_size`."""
+        if self._cache is None:
+            return CacheInfo(0, 0, 0, 0, 0)
+        return self._cache.info()
+
+    def cache_clear(self) -> None:
+        """Empty the result cache and reset its statistics."""
+        if self._cache is not None:
+            self._cache.clear()
+
+    def parse_many(
+        self,
+        argvs: Iterable[list[str] | str],
+        shared_prefixes: bool = False,
+        columnar: bool = False,
+    ) -> list[ParsedOptions | ParsedRecord | DocoptExit] | ParsedColumns:
+        """Parse each argument vector of `argvs`, for batches such as logs.
+
+        An argument vector that doesn't match gives its `DocoptExit` in place
+        of a result, instead of raising it, and help and version options are
+        parsed like any other. Argument vectors of the same shape, with the
+        same options and command words, and other arguments, in the same
+        order, match the same way: only the first of each shape is matched,
+        and the others only bind their values the way it did.
+
+        With `shared_prefixes`, the argument vectors are parsed in sorted
+        order, and each one resumes from where the previous one was parsed
+        up to the end of the tokens they start with, which pays off when
+        many share long prefixes such as `tool deploy --env prod`. Results
+        are in the order of `argvs` either way.
+
+        With `columnar`, the results are returned as `ParsedColumns`, with a
+        column of values per key instead of a result per argument vector.
+
+        Example
+        -------
+        >>> results = parser.parse_many(line.split() for line in log)
+        """
+        if self._plans is None:
+            self._start_plans()
+        if DocoptExit.usage is not self.usage:
+            DocoptExit.usage = self.usage
+        rows = self._parse_rows(argvs, shared_prefixes)
+        if columnar:
+            return self._columns(rows, shared_prefixes)
+        if not shared_prefixes:
+            return [result for _, result in rows]
+        ordered = sorted(rows, key=lambda row: row[0])
+        return [result for _, result in ordered]
+
+    def _parse_rows(
+        self, argvs: Iterable[list[str] | str], shared_prefixes: bool
+    ) -> Iterator[tuple[int, ParsedOptions | ParsedRecord | DocoptExit]]:
+        """Parse `argvs`, in sorted order with `shared_prefixes`, and yield the
+        index of each argument vector with its result."""
+        if not shared_prefixes:
+            for i, argv in enumerate(argvs):
+                try:
+                    parsed = _parse_argv(
+                        _Tokens(argv), list(self._options), self.options_first
+                    )
+                    yield i, self._parse_planned(parsed, self._shape(parsed))
+                except DocoptExit as e:
+                    yield i, e
+            return
+        token_lists = [a.split() if isinstance(a, str) else a for a in argvs]
+        previous: _Prefixed | None = None
+        for i in sorted(range(len(token_lists)), key=token_lists.__getitem__):
+            try:
+                previous = self._parse_prefixed(token_lists[i], previous)
+                yield i, self._parse_planned(previous.parsed, previous.shape)
+            except DocoptExit as e:
+                yield i, e
+
+    def _columns(
+        self,
+        rows: Iterable[tuple[int, ParsedOptions | ParsedRecord | DocoptExit]],
+        shared_prefixes: bool,
+    ) -> ParsedColumns:
+        """Gather the values of `rows` into a column per key."""
+        # NumPy is optional, and mypy may run with or without it installed.
+        numpy: Any
+        try:
+            numpy = importlib.import_module("numpy")
+        except ImportError:
+            numpy = None
+        builders = [
+            _column_builder(default, self._converters.get(key))
+            for key, default in self._defaults.items()
+        ]
+        # Appending to the array of a column directly saves a call per value.
+        adders = [
+            b.values.append if type(b) is _ArrayBuilder else b.add for b in builders
+        ]
+        errors = array("B")
+        indexes = array("q")
+        for i, result in rows:
+            indexes.append(i)
+            if isinstance(result, DocoptExit):
+                errors.append(1)
+                for builder in builders:
+                    builder.skip()
+                continue
+            errors.append(0)
+            values = result.values() if isinstance(result, dict) else result
+            for add, value in zip(adders, values):
+                add(value)
+        # Rows parsed out of order are put back in the order of `argvs`.
+        take = None
+        if shared_prefixes:
+            take = array("q", bytes(8 * len(indexes)))
+            for position, i in enumerate(indexes):
+                take[i] = position
+        columns = ParsedColumns(
+            (key, builder.build(numpy, take))
+            for key, builder in zip(self._defaults, builders)
+        )
+        columns.errors = _column_array(errors, numpy, take, bool)
+        return columns
+
+    def _shape(self, parsed: list[_Pattern], start: int = 0) -> tuple:
+        """The shape of `parsed[start:]`, which decides how it matches."""
+        words = self._command_words
+        # The value of an argument in `parsed` is the str it was given.
+        return tuple(
+            words.get(cast(str, e.value)) if type(e) is _Argument else e.name
+            for e in parsed[start:]
+        )
+
+    def _parse_prefixed(
+        self, tokens: list[str], previous: _Prefixed | None
+    ) -> _Prefixed:
+        """Parse `tokens`, resuming from the last checkpoint of the `previous`
+        argument vector that is within the tokens they start with."""
+        stream = _Tokens(tokens)
+        parsed: list[_Pattern] = []
+        shape: tuple = ()
+        options = list(self._options)
+        checkpoints = [(0, 0, len(options))]
+        if previous is not None:
+            common = _common_prefix(tokens, previous.tokens)
+            k = len(previous.checkpoints) - 1
+            while previous.checkpoints[k][0] > common:
+                k -= 1
+            stream.position, count, known = previous.checkpoints[k]
+            checkpoints = previous.checkpoints[: k + 1]
+            # The options parsing the prefix added for unknown ones.
+            options = previous.options[:known]
+            stream._kinds = previous.kinds[:common] + array(
+                "b", map(_argv_kind, tokens[common:])
+            )
+            parsed, shape = previous.parsed[:count], previous.shape[:count]
+        parsed = _parse_argv(
+            stream,
+            options,
+            self.options_first,
+            parsed=parsed,
+            checkpoints=checkpoints,
+        )
+        shape += self._shape(parsed, len(shape))
+        return _Prefixed(tokens, stream.kinds(), parsed, shape, options, checkpoints)
+
+    def _start_plans(self) -> None:
+        self._plans = _ParseCache(_PLAN_CACHE_SIZE)
+        # The shape of an argument vector keeps the arguments that are command
+        # words, since they decide the match, and leaves out the others.
+        commands = _index(self._pattern).leaves.get(_Command, ())
+        self._command_words = {
+            cast(str, c.name): (cast(str, c.name),) for c in commands
+        }
+
+    def _parse_planned(
+        self, parsed: list[_Pattern], shape: tuple
+    ) -> ParsedOptions | ParsedRecord:
+        plans = cast(_ParseCache, self._plans)
+        plan = plans.get(shape)
+        if plan is None:
+            plan = self._plan(parsed) or False
+            plans.put(shape, plan)
+        if plan is False:
+            return self._match(parsed)
+        result = ParsedOptions(self._defaults)
+        for key in self._mutable_defaults:
+            result[key] = result[key].copy()
+        result.update(plan.base)
+        for key, index in plan.singles:
+            result[key] = parsed[index].value
+        for key, template, positions in plan.lists:
+            value = template.copy()
+            for position, index in positions:
+                value[position] = parsed[index].value
+            result[key] = value
+        return self._finish(result)
+
+    def _plan(self, parsed: list[_Pattern]) -> _MatchPlan | None:
+        """Match `parsed` with its values replaced by markers, to find where
+        each value of the result comes from, or None if it doesn't match."""
+        markers: dict[str, int] = {}
+        tagged: list[_Pattern] = []
+        for index, e in enumerate(parsed):
+            marker = f"\0{index}"
+            if type(e) is _Argument and e.value not in self._command_words:
+                tagged.append(_Argument(None, marker))
+            elif type(e) is _Option and type(e.value) is str:
+                e = cast(_Option, e)
+                tagged.append(_Option(e.short, e.longer, e.argcount, marker))
+            else:
+                tagged.append(e)
+                continue
+            markers[marker] = index
+        base = self._match_values(tagged)
+        if base is None:
+            return None
+        singles, lists = [], []
+        for key, value in base.items():
+            if type(value) is str and value in markers:
+                singles.append((key, markers[value]))
+            elif type(value) is list:
+                positions = tuple(
+                    (position, markers[v])
+                    for position, v in enumerate(value)
+                    if type(v) is str and v in markers
+                )
+                lists.append((key, value, positions))
+        return _MatchPlan(base, tuple(singles), tuple(lists))
+
+    def _parse(self, argv: list[str] | str) -> ParsedOptions | ParsedRecord:
+        if DocoptExit.usage is not self.usage:
+            DocoptExit.usage = self.usage
+        parsed_arg_vector = _parse_argv(
+            _Tokens(argv), list(self._options), self.options_first
+        )
+        _extras(
+            self.default_help,
+            self.version,
+            parsed_arg_vector,
+            self._docstring or (lambda: self.docstring),
+        )
+        return self._match(parsed_arg_vector)
+
+    def _compiled_program(self) -> _Program:
+        if self._program is None:
+            self._program = _Program.compile(self._first_index.lines)
+        return self._program
+
+    def _match_values(self, parsed: list[_Pattern]) -> dict[str, Any] | None:
+        """The values of the first usage line that matches all of `parsed`,
+        or None if none does. Only the lines that can are tried."""
+        numbers = self._first_index.candidates(parsed)
+        if self.engine == "deterministic":
+            try:
+                return cast(_DeterministicMatcher, self._matcher).match(parsed, numbers)
+            except _Backtrack:
+                pass
+        return self._compiled_program().match(parsed, numbers)
+
+    def _match(self, parsed: list[_Pattern]) -> ParsedOptions | ParsedRecord:
+        values = self._match_values(parsed)
+        if values is not None:
+            result = ParsedOptions(self._defaults)
+            for key in self._mutable_defaults:
+                if key not in values:
+                    result[key] = result[key].copy()
+            result.update(values)
+            return self._finish(result)
+        # The matchers only tell whether a usage line matches. The error lists
+        # what the whole pattern tree collected and left, which only matching
+        # with it tells.
+        matched, left, collected = self._pattern.match(parsed)
+        if left:
+            raise DocoptExit(
+                f"Warning: found unmatched (duplicate?) arguments {left}",
+                collected=collected,
+                left=left,
+            )
+        raise DocoptExit(collected=collected, left=left)
+
+    def _finish(self, result: ParsedOptions) -> ParsedOptions | ParsedRecord:
+        """Convert the values of `result`, and make a record of it if asked."""
+        for key, converter in self._converters.items():
+            result[key] = _convert(key, result[key], converter, self.packed)
+        if self.slots:
+            return self.record_type._make(result.values())
+        result._aliases = self._aliases
+        return result
+
+
+class Commands:
+    """Route a git-style command line to lazily compiled subcommands.
+
+    The global `docstring` is parsed with `options_first=True` and must
+    describe a `<command>` argument followed by `[<args>...]`. Subcommands
+    are registered with `add`, and nothing is imported or parsed for a
+    subcommand until it is the one selected, so the cost of startup doesn't
+    depend on how many subcommands there are.
+
+    Example
+    -------
+    >>> commands = Commands(__doc__)
+    >>> commands.add("add", "mytool.add")  # uses mytool.add.__doc__
+    >>> commands.add("push", lambda: PUSH_USAGE)
+    >>> arguments, command, command_arguments = commands.parse()
+    """
+
+    def __init__(
+        self,
+        docstring: str,
+        default_help: bool = True,
+        version: Any = None,
+        command: str = "<command>",
+        args: str = "<args>",
+    ) -> None:
+        self._parser = Parser(docstring, default_help, version, options_first=True)
+        self._command = command
+        self._args = args
+        self._sources: dict[str, str | Callable[[], str]] = {}
+        self._parsers: dict[str, Parser] = {}
+
+    def add(self, name: str, source: str | Callable[[], str]) -> None:
+        """Register subcommand `name`.
+
+        `source` is either the dotted path of a module whose `__doc__`
+        describes the subcommand, or a callable returning that docstring.
+        """
+        self._sources[name] = source
+        self._parsers.pop(name, None)
+
+    def parser(self, name: str) -> Parser:
+        """Return the parser for subcommand `name`, compiling it if needed."""
+        parser = self._parsers.get(name)
+        if parser is None:
+            source = self._sources[name]
+            docstring: str | None
+            if callable(source):
+                docstring = source()
+            else:
+                docstring = importlib.import_module(source).__doc__
+            if not docstring:
+                raise DocoptLanguageError(f"{source!r} has no docstring.")
+            parser = self._parsers[name] = Parser(
+                docstring, self._parser.default_help, self._parser.version
+            )
+        return parser
+
+    def parse(
+        self, argv: list[str] | str | None = None
+    ) -> tuple[ParsedOptions, str, ParsedOptions]:
+        """Parse `argv` and dispatch the rest of it to the selected command.
+
+        Returns the global arguments, the command name and the arguments
+        parsed by the command's own docstring. The command is given the
+        slice of `argv` that starts at the command name.
+        """
+        argv = sys.argv[1:] if argv is None else argv
+        if isinstance(argv, str):
+            argv = argv.split()
+        arguments = cast(ParsedOptions, self._parser.parse(argv))
+        name = arguments[self._command]
+        if name not in self._sources:
+            raise DocoptExit(f"{name!r} is not a command.")
+        # With options_first, the command and everything after it are left
+        # as positional arguments, so they are the tail of argv.
+        rest = 1 + len(arguments.get(self._args) or [])
+        command_arguments = self.parser(name).parse(argv[len(argv) - rest :])
+        return arguments, name, cast(ParsedOptions, command_arguments)
 
 
 def docopt(
@@ -906,29 +3697,5 @@ def docopt(
      'serial': False,
      'tcp': True}
     """
-    argv = sys.argv[1:] if argv is None else argv
-    sections = _parse_docstring_sections(docstring)
-    _lint_docstring(sections)
-    DocoptExit.usage = sections.usage_header + sections.usage_body
-    options = [
-        *_parse_options(sections.before_usage),
-        *_parse_options(sections.after_usage),
-    ]
-    pattern = _parse_pattern(_formal_usage(sections.usage_body), options)
-    pattern_options = set(pattern.flat(_Option))
-    for options_shortcut in pattern.flat(_OptionsShortcut):
-        options_shortcut.children = [
-            opt for opt in options if opt not in pattern_options
-        ]
-    parsed_arg_vector = _parse_argv(_Tokens(argv), list(options), options_first)
-    _extras(default_help, version, parsed_arg_vector, docstring)
-    matched, left, collected = pattern.fix().match(parsed_arg_vector)
-    if matched and left == []:
-        return ParsedOptions((a.name, a.value) for a in (pattern.flat() + collected))
-    if left:
-        raise DocoptExit(
-            f"Warning: found unmatched (duplicate?) arguments {left}",
-            collected=collected,
-            left=left,
-        )
-    raise DocoptExit(collected=collected, left=left)
+    parser = Parser(docstring, default_help, version, options_first)
+    return cast(ParsedOptions, parser.parse(argv))
@@ -23,29 +23,33 @@ The most commonly used git commands are:
 See 'git help <command>' for more information on a specific command.
 """
 
-from subprocess import call
+from docopt import Commands
 
-from docopt import docopt
+COMMANDS = "add branch checkout clone commit push remote".split()
+
+HELP = """
+usage: git help [<command>]
+"""
+
+commands = Commands(__doc__, version="git version 1.7.4.4")
+# Subcommands are registered by module path; a module is only imported when
+# its command is selected.
+for name in COMMANDS:
+    commands.add(name, "git_" + name)
+commands.add("help", lambda: HELP)
 
 if __name__ == "__main__":
-    args = docopt(__doc__, version="git version 1.7.4.4", options_first=True)
+    args, command, command_args = commands.parse()
+    if command == "help":
+        name = command_args["<command>"]
+        if name is None:
+            print(__doc__.strip())
+        elif name in COMMANDS:
+            print(commands.parser(name).docstring.strip())
+        else:
+            exit("%r is not a git.py command. See 'git help'." % name)
+        exit()
     print("global arguments:")
     print(args)
     print("command arguments:")
-
-    argv = [args["<command>"]] + args["<args>"]
-    if args["<command>"] == "add":
-        # In case subcommand is implemented as python module:
-        import git_add
-
-        print(docopt(git_add.__doc__, argv=argv))
-    elif args["<command>"] == "branch":
-        # In case subcommand is a script in some other programming language:
-        exit(call(["python", "git_branch.py"] + argv))
-    elif args["<command>"] in "checkout clone commit push remote".split():
-        # For the rest we'll just keep DRY:
-        exit(call(["python", "git_%s.py" % args["<command>"]] + argv))
-    elif args["<command>"] in ["help", None]:
-        exit(call(["python", "git.py", "--help"]))
-    else:
-        exit("%r is not a git.py command. See 'git help'." % args["<command>"])
+    print(command_args)
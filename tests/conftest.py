@@ -63,6 +63,18 @@ class DocoptTestFile(pytest.File):
                 yield DocoptTestItem.from_parent(
                     name=name, parent=self, doc=doc, case=case
                 )
+            yield DocoptIRTestItem.from_parent(
+                name=f"{name}-ir", parent=self, doc=doc, cases=cases
+            )
+            yield DocoptBatchTestItem.from_parent(
+                name=f"{name}-batch", parent=self, doc=doc, cases=cases
+            )
+            yield DocoptOptimizerTestItem.from_parent(
+                name=f"{name}-optimized", parent=self, doc=doc, cases=cases
+            )
+            yield DocoptProgramTestItem.from_parent(
+                name=f"{name}-program", parent=self, doc=doc, cases=cases
+            )
 
 
 class DocoptTestItem(pytest.Item):
@@ -98,6 +110,127 @@ class DocoptTestItem(pytest.Item):
         return self.path, 0, f"usecase: {self.name}"
 
 
+class DocoptParserTestItem(pytest.Item):
+    """Base of the items that check a way of parsing against the cases of a
+    docstring that compiles, through `check`."""
+
+    def __init__(self, name, parent, doc, cases):
+        super().__init__(name, parent)
+        self.doc = doc
+        self.cases = cases
+
+    def runtest(self):
+        try:
+            parser = docopt.Parser(self.doc)
+        except docopt.DocoptLanguageError:
+            return
+        self.check(parser)
+
+    def check(self, parser):
+        raise NotImplementedError
+
+    def reportinfo(self):
+        return self.path, 0, f"usecase: {self.name}"
+
+
+class DocoptIRTestItem(DocoptParserTestItem):
+    """Check that the grammar loaded from a parser's IR is the same, and
+    parses the cases the same way."""
+
+    def check(self, parser):
+        ir = parser.to_ir()
+        loaded = docopt.Parser.from_ir(json.dumps(ir))
+        assert loaded.to_ir() == ir
+        assert repr(loaded._pattern) == repr(parser._pattern)
+        for _, argv, expect in self.cases:
+            try:
+                result = loaded.parse(argv)
+            except docopt.DocoptExit:
+                result = "user-error"
+            assert result == expect, (argv, result, expect)
+
+
+class DocoptBatchTestItem(DocoptParserTestItem):
+    """Check that `parse_many` parses the cases like `parse`, the second time
+    from the plans it made the first time, and with shared prefixes."""
+
+    def check(self, parser):
+        argvs = [argv for _, argv, _ in self.cases]
+        for shared_prefixes in [False, True]:
+            results = parser.parse_many(argvs, shared_prefixes)
+            for (_, argv, expect), result in zip(self.cases, results):
+                if isinstance(result, docopt.DocoptExit):
+                    result = "user-error"
+                assert result == expect, (argv, result, expect)
+
+
+class DocoptOptimizerTestItem(DocoptParserTestItem):
+    """Check that the optimized pattern is no larger than the pattern as
+    parsed, and parses the cases, their prefixes and the cases without one of
+    their tokens the same way, errors included."""
+
+    def check(self, parser):
+        with mock.patch.object(docopt._BranchPattern, "optimize", lambda p: p):
+            unoptimized = docopt.Parser(self.doc)
+        assert size(parser._pattern) <= size(unoptimized._pattern)
+        for argv in sorted(variants(self.cases)):
+            assert outcome(parser, argv) == outcome(unoptimized, argv), argv
+
+
+class DocoptProgramTestItem(DocoptParserTestItem):
+    """Check that the compiled program matches the cases, their prefixes and
+    the cases without one of their tokens with the same usage line, and the
+    same values, as the pattern tree."""
+
+    def check(self, parser):
+        program = parser._compiled_program()
+        lines = list(range(len(parser._first_index.lines)))
+        for argv in sorted(variants(self.cases)):
+            try:
+                options = list(parser._options)
+                parsed = docopt._parse_argv(docopt._Tokens(argv), options)
+            except docopt.DocoptExit:
+                continue
+            assert program.match(parsed, lines) == tree_values(parser, parsed), argv
+
+
+def tree_values(parser, parsed):
+    """The values the pattern tree of the first usage line that matches all
+    of `parsed` collects, or None if none does."""
+    index = parser._first_index
+    for number in index.candidates(parsed):
+        matched, left, collected = index.lines[number].match(parsed, [])
+        if matched and not left:
+            return {a.name: a.value for a in collected}
+    return None
+
+
+def variants(cases) -> set:
+    """The argument vectors of `cases`, their prefixes, and the argument
+    vectors without one of their tokens."""
+    argvs = set()
+    for _, argv, _ in cases:
+        tokens = argv.split()
+        for i in range(len(tokens) + 1):
+            argvs.add(" ".join(tokens[:i]))
+            argvs.add(" ".join(tokens[:i] + tokens[i + 1 :]))
+    return argvs
+
+
+def size(pattern) -> int:
+    """The number of nodes of `pattern`."""
+    return 1 + sum(map(size, getattr(pattern, "children", ())))
+
+
+def outcome(parser, argv):
+    try:
+        return parser.parse(argv)
+    except docopt.DocoptExit as e:
+        return str(e)
+    except SystemExit as e:
+        return e.code
+
+
 class DocoptTestException(Exception):
     pass
 
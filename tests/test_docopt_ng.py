@@ -1,7 +1,18 @@
+import copy
+import gc
+import json
+import os
+import pickle
+import sys
+import threading
+from array import array
+
 import pytest
+from conftest import tree_values
 
 import docopt
 from docopt import DocoptExit
+from docopt import DocoptLanguageError
 from docopt import _Argument
 from docopt import _Option
 from docopt import _parse_argv
@@ -80,3 +91,781 @@ def test_docopt_ng_dot_access_with_dash():
     assert arguments.v
     assert arguments.FILE == "file.py"
     assert arguments.dash_arg
+
+
+def test_parser_reuse():
+    parser = docopt.Parser("usage: prog [--to=SITE]... [<file>...]")
+    first = parser.parse("a b")
+    assert first == {"--to": [], "<file>": ["a", "b"]}
+    first["--to"].append("mutated")
+    assert parser.parse("--to x") == {"--to": ["x"], "<file>": []}
+    assert parser.parse("") == {"--to": [], "<file>": []}
+
+
+def test_commands(tmp_path, monkeypatch):
+    (tmp_path / "prog_add.py").write_text('"""usage: prog add [-v] <file>..."""\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    loaded = []
+
+    def rm_usage():
+        loaded.append("rm")
+        return "usage: prog rm <file>"
+
+    commands = docopt.Commands("usage: prog [-q] <command> [<args>...]")
+    commands.add("add", "prog_add")
+    commands.add("rm", rm_usage)
+
+    argv = ["-q", "add", "-v", "a", "b"]
+    arguments, command, command_arguments = commands.parse(argv)
+    assert arguments == {"-q": True, "<command>": "add", "<args>": ["-v", "a", "b"]}
+    assert command == "add"
+    assert command_arguments == {"add": True, "-v": True, "<file>": ["a", "b"]}
+    assert loaded == []
+
+    assert commands.parse("rm x")[2] == {"rm": True, "<file>": "x"}
+    assert commands.parse("rm y")[2] == {"rm": True, "<file>": "y"}
+    assert loaded == ["rm"]
+
+    with pytest.raises(DocoptExit, match="'mv' is not a command"):
+        commands.parse("mv x")
+
+    (tmp_path / "prog_cp.py").write_text("import sys\n")
+    commands.add("cp", "prog_cp")
+    with pytest.raises(DocoptLanguageError, match="'prog_cp' has no docstring"):
+        commands.parse("cp x")
+
+
+def test_docopt_ng_dot_access_falsy_values():
+    arguments = docopt.docopt(
+        "usage: prog [-v] [--dry-run] [--level=N] [<host>]", "--level 0"
+    )
+    assert arguments.v is False
+    assert arguments.dry_run is False
+    assert arguments.level == "0"
+    assert arguments.host is None
+    assert arguments.missing is None
+    assert docopt.ParsedOptions({"--dry-run": False}).dry_run is False
+
+
+@pytest.mark.parametrize(
+    "clone", [copy.copy, copy.deepcopy, lambda r: pickle.loads(pickle.dumps(r))]
+)
+def test_parsed_options_copy_and_pickle(clone):
+    parser = docopt.Parser("usage: prog [--dry-run] [<host>...]", cache_size=2)
+    for result in docopt.docopt(parser.docstring, "--dry-run a"), parser.parse("a"):
+        cloned = clone(result)
+        assert cloned == result
+        assert type(cloned) is type(result)
+        assert cloned.dry_run is result.dry_run
+        assert cloned.host == result.host
+    with pytest.raises(AttributeError):
+        result.__setstate__
+
+
+def test_parser_slots():
+    doc = """usage: prog [-v] [--dry-run] [--level=N] <host> [<file-name>...] [--]"""
+    parser = docopt.Parser(doc, slots=True)
+    result = parser.parse("-v web a b")
+    assert isinstance(result, docopt.ParsedRecord)
+    assert isinstance(result, parser.record_type)
+    assert not hasattr(result, "__dict__")
+    assert result.v is True
+    assert result.dry_run is False
+    assert result.level is None
+    assert result.host == "web"
+    assert result.file_name == ["a", "b"]
+    assert result.as_dict() == docopt.docopt(doc, "-v web a b")
+    assert result.as_dict().host == "web"
+    assert type(parser.parse("x")) is type(result)
+
+
+def test_option_type():
+    option = _Option.parse("-n N  Count [default: 3] [type: int]")
+    assert option == _Option("-n", None, 1, "3")
+    assert option.type_name == "int"
+    assert _Option.parse("-n N  [TYPE: float] [default: 3]").type_name == "float"
+    assert _Option.parse("-n  Flag [type: int]").type_name is None
+
+
+def test_parser_types():
+    doc = """usage: prog [--ratio=R] [--level=N] [--name=S] <n>...
+
+    options:
+      --ratio=R  Ratio [type: float]
+      --level=N  Level [default: 2] [type: int]
+      --name=S   Name
+    """
+    parser = docopt.Parser(doc, types={"<n>": "int", "--name": str.upper})
+    assert parser.parse("--ratio .5 --name x 1 2 3") == {
+        "--ratio": 0.5,
+        "--level": 2,
+        "--name": "X",
+        "<n>": [1, 2, 3],
+    }
+    packed = docopt.Parser(doc, types={"<n>": int}, packed=True).parse("1 -2 3")
+    assert packed["<n>"] == array("q", [1, -2, 3])
+    assert packed["--ratio"] is None
+
+    with pytest.raises(DocoptExit, match=r"Invalid value for <n>: 'x'"):
+        parser.parse("1 2 x 4")
+    with pytest.raises(DocoptExit, match=r"Invalid value for --level: '1.5'"):
+        parser.parse("--level=1.5 1")
+    with pytest.raises(DocoptExit, match=r"Invalid value for <n>: '9{20}'"):
+        docopt.Parser(doc, types={"<n>": int}, packed=True).parse("1 " + "9" * 20)
+    with pytest.raises(DocoptLanguageError, match=r"Unknown type 'num' for <n>"):
+        docopt.Parser(doc, types={"<n>": "num"})
+    with pytest.raises(DocoptLanguageError, match=r"<m> is not in the usage"):
+        docopt.Parser(doc, types={"<m>": int})
+
+
+def test_repeated_positional_arguments_are_matched_in_one_pass():
+    argv = ["-v", "--"] + [f"file{i}" for i in range(20000)]
+    result = docopt.docopt("usage: prog [-v] [--] <file>...", argv)
+    assert result["<file>"] == argv[2:]
+    assert all(a is b for a, b in zip(result["<file>"], argv[2:]))
+    assert docopt.docopt("usage: prog <x> <x>...", "a b c") == {"<x>": ["a", "b", "c"]}
+
+
+def test_either_stops_at_first_complete_match():
+    tried = []
+
+    class Line(docopt._Required):
+        def match(self, left, collected=None):
+            tried.append(self)
+            return super().match(left, collected)
+
+    lines = [
+        Line(_Argument("<x>"), _Argument("<y>")),
+        Line(docopt._Command("go")),
+        Line(docopt._Command("go"), docopt._NotRequired(_Argument("<x>"))),
+    ]
+    matched, left, _ = docopt._Either(*lines).match([_Argument(None, "go")])
+    assert matched and left == []
+    assert [id(line) for line in tried] == [id(lines[0]), id(lines[1])]
+    # The alternatives after a complete match still count an option collected
+    # before the group, as they always have.
+    v = _Option("-v", None, 0, 0)
+    either = docopt._Either(docopt._Required(v), docopt._Required(v))
+    _, _, collected = either.match(
+        [_Option("-v", None, 0, True)], [_Option("-v", None, 0, 1)]
+    )
+    assert collected[0].value == 3
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        _Argument("<a>", "x"),
+        docopt._Command("cmd"),
+        _Option("-a", "--all"),
+        docopt._Required(),
+        docopt._NotRequired(),
+        docopt._OptionsShortcut(),
+        docopt._OneOrMore(),
+        docopt._Either(),
+    ],
+)
+def test_patterns_have_no_instance_dict(pattern):
+    assert not hasattr(pattern, "__dict__")
+
+
+def test_pattern_equality_is_structural():
+    assert _Option("-a", "--all") == _Option("-a", "--all")
+    assert hash(_Option("-a", "--all")) == hash(_Option("-a", "--all", 0, True))
+    assert _Option("-a", None, 0, True) != _Option("-a", None, 0, 1)
+    assert _Argument("N") != docopt._Command("N")
+    assert docopt._Required(_Argument("N")) != docopt._NotRequired(_Argument("N"))
+    assert _Argument("N") != "N"
+
+    leaves = [_Argument(f"<a{i % 100}>") for i in range(10000)]
+    pattern = docopt._Required(*leaves)
+    pattern.fix_identities()
+    assert len({id(c) for c in pattern.children}) == 100
+
+
+def test_pattern_index():
+    a, b, n = _Option("-a"), _Option("-b"), _Argument("N")
+    shortcut = docopt._OptionsShortcut(b)
+    pattern = docopt._Required(
+        docopt._NotRequired(a, shortcut), docopt._OneOrMore(n), docopt._Command("go")
+    )
+    index = docopt._index(pattern)
+    assert index.leaves[_Option] == (a, b)
+    assert index.leaves[_Argument] == (n,)
+    assert index.shortcuts == (shortcut,)
+    assert list(index.defaults) == [leaf.name for leaf in pattern.flat()]
+
+
+def test_optimize():
+    go, x, y = docopt._Command("go"), _Argument("<x>"), _Argument("<y>")
+    Required, Either = docopt._Required, docopt._Either
+    pattern = Required(
+        Either(Required(go, x), Required(go, Required(y)), Required(go, x))
+    ).fix()
+    assert pattern == Required(go, Either(x, y))
+    pattern = Required(docopt._NotRequired(docopt._NotRequired(x), Required(y)))
+    assert pattern.fix() == Required(docopt._NotRequired(x, y))
+    # A counted option is matched again by each alternative, and a repeated
+    # argument collects a value more for each.
+    v = _Option("-v")
+    pattern = Required(Either(Required(v, v, x), Required(v, v, y), v, v)).fix()
+    assert pattern == Required(
+        Either(
+            Required(_Option("-v", None, 0, 0), _Option("-v", None, 0, 0), x),
+            Required(_Option("-v", None, 0, 0), _Option("-v", None, 0, 0), y),
+            _Option("-v", None, 0, 0),
+            _Option("-v", None, 0, 0),
+        )
+    )
+    # Options can be skipped, so lines that start with them start with
+    # whatever comes after, and are left apart.
+    q = _Option("-q")
+    pattern = Required(Either(Required(q, x), Required(q, y))).fix()
+    assert pattern == Required(Either(Required(q, x), Required(q, y)))
+
+
+def test_first_index():
+    go, x = docopt._Command("go"), _Argument("<x>")
+    first = docopt._first
+    assert first(docopt._Required(docopt._NotRequired(go), x)) == ({"go"}, True, False)
+    assert first(docopt._Required(go, x)) == ({"go"}, False, False)
+    assert first(docopt._Either(_Option("-a"), go)) == ({"go"}, False, True)
+    assert first(docopt._OneOrMore(docopt._Required(_Option("-a"), x))) == (
+        set(),
+        True,
+        False,
+    )
+    doc = """Usage:
+      prog ship new <name>...
+      prog mine (set|remove) <x> <y>
+      prog ship <name> move <x> <y>
+      prog <file>
+      prog [--speed=<kn>]
+    """
+    parser = docopt.Parser(doc)
+    index = parser._first_index
+
+    def candidates(argv):
+        return index.candidates(_parse_argv(_Tokens(argv), list(parser._options)))
+
+    assert candidates("ship new a") == [0, 2, 3]
+    assert candidates("--speed=1 mine set 1 2") == [1, 3]
+    assert candidates("titanic") == [3]
+    assert candidates("--speed=1") == [4]
+    for argv in ["ship new a", "ship a move 1 2", "mine remove 1 2", "a", "", "a b"]:
+        parsed = _parse_argv(_Tokens(argv), list(parser._options))
+        matched, left, collected = parser._pattern.match(parsed)
+        if matched and not left:
+            assert tree_values(parser, parsed) == {a.name: a.value for a in collected}
+        else:
+            assert tree_values(parser, parsed) is None
+
+
+def test_deterministic_engine():
+    doc = """Usage:
+      prog remote (add|rm) [-v...] <name>
+      prog show [--json | --yaml] <file>...
+      prog (-q | --quiet) [<x> <y>]
+    """
+    parser = docopt.Parser(doc)
+    general = docopt.Parser(doc)
+    general._engine = "general"
+    assert parser.engine == "deterministic"
+    for argv in [
+        "remote add -vv origin",
+        "-v remote rm origin",
+        "show --yaml a b --json",
+        "show a b",
+        "--quiet -q",
+        "-q 1 2",
+        "-q 1",
+        "remote origin",
+        "",
+    ]:
+        try:
+            expected = general.parse(argv)
+        except DocoptExit as e:
+            with pytest.raises(DocoptExit) as caught:
+                parser.parse(argv)
+            assert str(caught.value) == str(e)
+        else:
+            assert parser.parse(argv) == expected
+    # Both alternatives can start with "a", and "go" can be either.
+    for doc in ["Usage: prog (a <x> | a b)", "Usage: prog (go | <x>) <y>"]:
+        assert docopt.Parser(doc).engine == "general"
+    parser.merge("Usage: prog <x> <y> <z>")
+    assert parser.engine == "deterministic"
+    assert parser.parse("1 2 3")["<z>"] == "3"
+
+
+def test_program():
+    doc = """Usage:
+      prog (<x> | go) [-v...] [<y>]
+      prog [(-v | -q) <z>]...
+    """
+    parser = docopt.Parser(doc)
+    assert parser.engine == "general"
+    program = parser._compiled_program()
+    assert program.code.typecode == "i" and len(program.code) % 3 == 0
+    assert list(program.entries) == [0, program.code[1]]
+    lines = [0, 1]
+    for argv in ["go -vv 1", "a b", "-v 1 -q 2 -v 3", "-q", "go go go", ""]:
+        parsed = _parse_argv(_Tokens(argv), list(parser._options))
+        assert program.match(parsed, lines) == tree_values(parser, parsed)
+    assert parser.parse("-v 1 -q 2") == {
+        "<x>": None,
+        "go": False,
+        "-v": 1,
+        "<y>": None,
+        "-q": 1,
+        "<z>": ["1", "2"],
+    }
+    # The program is loaded with the grammar rather than compiled again.
+    ir = json.loads(json.dumps(parser.to_ir()))
+    loaded = docopt.Parser.from_ir(ir)
+    assert loaded._program is not None
+    assert loaded._program.code == program.code
+    assert loaded.parse("x -vvv") == parser.parse("x -vvv")
+    del ir["program"]
+    assert docopt.Parser.from_ir(ir).to_ir()["program"] == program.encode()
+    # An empty [options] shortcut stays in the tree, for `merge` to add to,
+    # but not in what is compiled from it.
+    parser = docopt.Parser("Usage: prog [options] [-a] <x>\n\nOptions:\n  -a")
+    assert parser._shortcuts and not parser._shortcuts[0].children
+    program = parser._compiled_program()
+    assert list(program.code[::3]) == [
+        docopt._OP_REQUIRED,
+        docopt._OP_OPTIONAL,
+        docopt._OP_OPTION,
+        docopt._OP_ARGUMENT,
+    ]
+    assert parser.engine == "deterministic"
+    assert len(parser._matcher.lines[0][1]) == 2
+    parser.merge("Options:\n  -b")
+    assert parser.parse("-b x") == {"-a": False, "<x>": "x", "-b": True}
+
+
+def test_scan_options():
+    text = (
+        "Options: -v, --verbose  Be verbose.\n"
+        "  -n N, --number=N   The number\n"
+        "                     of things [default: 2] [type: int]\n"
+        "\n"
+        "More options:\n"
+        "  --dry-run  - is not an option here.\n"
+    )
+    assert docopt._scan_options(text, first_line=10) == [
+        ("-v", "--verbose", 0, False, None, 10),
+        ("-n", "--number", 1, "2", "int", 11),
+        (None, "--dry-run", 0, False, None, 15),
+    ]
+
+
+def test_usage_errors_report_line_and_column():
+    doc = "Usage:\n  prog add <x>\n  prog rm [--force <y>\n"
+    with pytest.raises(
+        DocoptLanguageError, match=r"unmatched '\[' \(line 3, column 11\)"
+    ):
+        docopt.docopt(doc, "add 1")
+    doc = "Usage: prog --long=ARG\n\nOptions:\n  --long"
+    with pytest.raises(
+        DocoptLanguageError,
+        match=r"--long must not have an argument \(line 1, column 13\)",
+    ):
+        docopt.docopt(doc, "")
+    # Errors at the end of the pattern point at its last token.
+    for doc, column in [("Usage: prog a b )\n", 17), ("Usage: prog <a>... prog )", 25)]:
+        with pytest.raises(
+            DocoptLanguageError,
+            match=rf"unexpected ending: '\)' \(line 1, column {column}\)",
+        ):
+            docopt.Parser(doc)
+
+
+def test_lex_usage():
+    text = "Usage: prog [-hv] <file name>...\n       prog (a|b)\n"
+    tokens = docopt._lex_usage(text, len("Usage:"))
+    columns = [tokens.where(i) for i in range(len(tokens))]
+    assert (
+        tokens.rest()
+        == docopt._Tokens.from_pattern(
+            docopt._formal_usage(text[len("Usage:") :])
+        ).rest()
+    )
+    assert columns[1] == " (line 1, column 13)"  # [
+    assert columns[4] == " (line 1, column 19)"  # <file name>
+    assert columns[5] == " (line 1, column 30)"  # ...
+    assert columns[6:9] == [" (line 2, column 8)"] * 3  # ) | ( for "prog"
+
+
+@pytest.mark.parametrize(
+    "token, kind",
+    [
+        ("file", docopt._POSITIONAL),
+        ("", docopt._POSITIONAL),
+        ("-", docopt._DASH),
+        ("--", docopt._DOUBLE_DASH),
+        ("--all", docopt._LONG),
+        ("--name=x", docopt._LONG_WITH_VALUE),
+        ("-abc", docopt._SHORTS),
+        ("-n5", docopt._SHORTS),
+        ("-1", docopt._NUMBER),
+        ("-.5", docopt._NUMBER),
+        ("-1e3", docopt._NUMBER),
+        ("-inf", docopt._NUMBER),
+        ("-info", docopt._SHORTS),
+        ("-NaN", docopt._NUMBER),
+    ],
+)
+def test_argv_kind(token, kind):
+    assert docopt._argv_kind(token) == kind
+
+
+def _example_grammar():
+    G = docopt.Grammar
+    grammar = G("prog")
+    grammar.option("-h", "--help", help="Show this screen.")
+    grammar.option("-n", "--number", 1, "3", "A number,\nover two lines.", "int")
+    grammar.options([("-q",), {"long": "--name", "argcount": 1}])
+    grammar.usage(G.optional("options"), "add", G.repeat("<file>"))
+    grammar.usage("rm", G.either("--force", G.required("--dry-run", "-q")), "[<x>]")
+    grammar.usages([[G.repeat(G.either("a", "b c")), "(e|f)..."]])
+    return grammar
+
+
+def test_grammar_matches_docstring():
+    grammar = _example_grammar()
+    docstring = grammar.render()
+    assert docstring.startswith(
+        "Usage:\n"
+        "  prog [options] add <file>...\n"
+        "  prog rm (--force | (--dry-run -q)) [<x>]\n"
+        "  prog (a | b c)... ((e|f)...)\n"
+    )
+    built, parsed = docopt.Parser(grammar), docopt.Parser(docstring)
+    assert built._pattern == parsed._pattern
+    assert built._options == parsed._options
+    assert built.usage == grammar.render_usage()
+    for argv in ["add -n 5 x y", "rm --dry-run -q", "a b c e f", "rm --force x"]:
+        assert built.parse(argv) == parsed.parse(argv)
+    assert built.parse("add x")["--number"] == 3
+
+
+def test_grammar_renders_help_lazily(capsys):
+    grammar = _example_grammar()
+    parser = docopt.Parser(grammar)
+    grammar.usage("changed")  # doesn't affect the parser
+    parser.parse("rm --force")
+    assert parser._docstring is None
+    with pytest.raises(SystemExit):
+        parser.parse("--help")
+    assert capsys.readouterr().out == _example_grammar().render().strip("\n") + "\n"
+
+
+def test_grammar_errors():
+    grammar = docopt.Grammar("prog")
+    with pytest.raises(DocoptLanguageError, match="needs a short or a long name"):
+        grammar.option(help="Nothing.")
+    grammar.usage("[-x")
+    with pytest.raises(DocoptLanguageError, match=r"unmatched '\['"):
+        docopt.Parser(grammar)
+
+
+_MERGED_DOC = """Usage:
+  prog [options] add <file>...
+  prog -v... status
+  prog push [--force] <remote> [options]
+  prog pull -v <remote>
+
+Options:
+  -v, --verbose  Be verbose.
+  --dry  Dry run.
+  --force  Force it.
+  --depth=<n>  Depth [default: 3] [type: int]
+"""
+
+
+@pytest.mark.parametrize("split", [1, 2, 3])
+def test_merge_matches_combined_docstring(split):
+    usage, options = _MERGED_DOC.split("\n\n")
+    lines, option_lines = usage.splitlines()[1:], options.splitlines()[1:]
+    base = "Usage:\n{}\n\nOptions:\n{}\n".format(
+        "\n".join(lines[:split]), "\n".join(option_lines[:2])
+    )
+    parser = docopt.Parser(base)
+    parser.merge("Usage:\n{}\n".format("\n".join(lines[split:])))
+    parser.merge("Options:\n{}\n".format("\n".join(option_lines[2:])))
+    combined = docopt.Parser(_MERGED_DOC)
+    assert parser._pattern == combined._pattern
+    assert parser._options == combined._options
+    assert parser.usage == combined.usage.rstrip()
+    for argv in ["add x --dry --depth 5", "-vv status", "push o --dry", "pull -v o"]:
+        assert parser.parse(argv) == combined.parse(argv)
+    parser.slots = True
+    assert parser.parse("push o --depth 5").as_dict() == combined.parse(
+        "push o --depth 5"
+    )
+
+
+def test_merge_grammar():
+    parser = docopt.Parser(_example_grammar())
+    plugin = docopt.Grammar("prog")
+    plugin.option("-y", "--yes", help="Assume yes.")
+    plugin.usage("push", "[--yes]", "<remote>")
+    parser.merge(plugin)
+    assert parser.parse("push -y origin")["--yes"] is True
+    assert parser.parse("add -n 5 x")["<remote>"] is None
+    assert parser.usage.endswith("\n  prog push [--yes] <remote>")
+    assert parser.docstring.endswith("  -y, --yes  Assume yes.\n")
+
+
+def test_merge_errors_leave_parser_unchanged():
+    parser = docopt.Parser("Usage: prog [options]\n\nOptions:\n  --depth=<n>  D.")
+    with pytest.raises(DocoptLanguageError, match="already described differently"):
+        parser.merge("Usage: prog push\n\nOptions:\n  --depth  D.")
+    with pytest.raises(DocoptLanguageError, match="Unknown type"):
+        parser.merge("Options:\n  --name=<x>  N [type: nope]")
+    assert parser.parse("--depth 3") == {"--depth": "3"}
+    with pytest.raises(DocoptExit):
+        parser.parse("push")
+    with pytest.raises(DocoptExit):
+        parser.parse("--name x")
+    # Once described, an option named in the usage can't be described again
+    # differently either.
+    parser = docopt.Parser("Usage: prog --quiet", cache_size=2)
+    parser.merge("Options: -q, --quiet")
+    with pytest.raises(DocoptLanguageError, match="already described differently"):
+        parser.merge("Options: -q, --other")
+    assert parser.parse("-q") == {"--quiet": True}
+
+
+@pytest.mark.parametrize(
+    "base, fragment, combined, argv",
+    [
+        ("Usage: prog --quiet", "Options: -q, --quiet", None, "-q"),
+        ("Usage: prog --num=<x>", "Options: -n <x>, --num=<x>", None, "-n 3"),
+        ("Usage: prog -q [options]", "Options:\n  -q, --quiet\n  -v", None, "-q -v"),
+        (
+            "Usage: prog go -n <x>",
+            "Usage: prog stop\n\nOptions: -n <x>  [type: int]",
+            "Usage:\n  prog go -n <x>\n  prog stop\n\nOptions: -n <x>  [type: int]",
+            "go -n 2",
+        ),
+    ],
+)
+def test_merge_describes_options_named_in_usage(base, fragment, combined, argv):
+    expected = docopt.Parser(combined or f"{base}\n\n{fragment}")
+    parser = docopt.Parser(base, cache_size=2)
+    with pytest.raises(DocoptExit):
+        parser.parse("x")
+    parser.merge(fragment)
+    assert parser.cache_info().currsize == 0
+    assert parser.parse(argv) == expected.parse(argv)
+    assert parser._keys == expected._keys
+    assert parser.docstring == f"{base}\n{fragment}"
+
+
+def test_ir_round_trip():
+    parser = docopt.Parser(_example_grammar())
+    parser.merge("Options:\n  --depth=<n>  Depth [default: 2] [type: int]")
+    ir = parser.to_ir()
+    assert ir["docopt_ir"] == 1
+    loaded = docopt.Parser.from_ir(json.dumps(ir), slots=True, types={"<x>": int})
+    assert loaded.to_ir() == ir
+    assert loaded.docstring == parser.docstring
+    assert loaded.usage == parser.usage
+    result = loaded.parse("rm --force 5")
+    assert result.x == 5 and result.number == 3 and result.depth == 2
+    assert result.as_dict() == {**parser.parse("rm --force 5"), "<x>": 5}
+
+
+def test_ir_errors():
+    ir = docopt.Parser("Usage: prog <x>").to_ir()
+    with pytest.raises(DocoptLanguageError, match="Unsupported grammar version 2"):
+        docopt.Parser.from_ir({**ir, "docopt_ir": 2})
+    with pytest.raises(DocoptLanguageError, match="Unknown kind of group 'many'"):
+        docopt.Parser.from_ir({**ir, "pattern": ["many", [0]]})
+
+
+def test_freeze():
+    parser = docopt.Parser(_example_grammar(), slots=True)
+    ir = parser.to_ir()
+    parser.freeze()
+    state = dict(vars(parser))
+    assert parser.parse("rm --force 5").force is True
+    with pytest.raises(DocoptExit):
+        parser.parse("rm --nope")
+    assert vars(parser) == state
+    assert all(vars(parser)[key] is value for key, value in state.items())
+    assert parser.to_ir() == ir
+    with pytest.raises(TypeError, match="frozen"):
+        parser.merge("Options:\n  --depth=<n>  Depth.")
+
+
+def _private_memory() -> int:
+    """The kB of memory only this process uses, which forking doesn't share."""
+    with open("/proc/self/smaps_rollup") as f:
+        return sum(
+            int(line.split()[1])
+            for line in f
+            if line.startswith(("Private_Clean:", "Private_Dirty:"))
+        )
+
+
+def _worker_growth(parser: docopt.Parser) -> int:
+    """The kB of memory a forked worker copies to parse and collect garbage."""
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        try:
+            before = _private_memory()
+            parser.parse("cmd7 --opt7=x a b")
+            gc.collect()
+            os.write(write, str(_private_memory() - before).encode())
+        finally:
+            os._exit(0)
+    os.close(write)
+    os.waitpid(pid, 0)
+    with os.fdopen(read) as f:
+        return int(f.read())
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/smaps_rollup"), reason="needs /proc of Linux"
+)
+def test_frozen_parser_is_shared_with_forked_workers():
+    usages = "".join(f"  prog cmd{i} [--opt{i}=<v>] <file>...\n" for i in range(1000))
+    options = "".join(f"  --opt{i}=<v>  Option {i}.\n" for i in range(1000))
+    parser = docopt.Parser(f"Usage:\n{usages}\nOptions:\n{options}")
+    unfrozen = _worker_growth(parser)
+    parser.freeze()
+    gc.freeze()
+    try:
+        frozen = _worker_growth(parser)
+    finally:
+        gc.unfreeze()
+    assert frozen < unfrozen / 2
+
+
+def test_parse_cache():
+    parser = docopt.Parser(_example_grammar(), cache_size=2, types={"<x>": int})
+    result = parser.parse("rm --force 5")
+    assert parser.parse("rm --force 5") is result
+    expected = docopt.Parser(_example_grammar()).parse("rm --force 5")
+    assert result == parser.parse(["rm", "--force", "5"])
+    assert result == {**expected, "<x>": 5, "<file>": ()}
+    with pytest.raises(TypeError, match="read-only"):
+        result["<x>"] = 6
+    with pytest.raises(TypeError, match="read-only"):
+        result.update(x=6)
+    for _ in range(2):
+        with pytest.raises(DocoptExit, match="Usage") as exit:
+            parser.parse("rm --nope")
+    assert exit.value.left
+    info = parser.cache_info()
+    assert info[:4] == (2, 3, 2, 2) and info.nbytes > 0
+    parser.parse("rm --force 1")
+    assert parser.parse("rm --force 5") is not result
+    parser.merge("Options:\n  --depth=<n>  Depth.")
+    assert parser.cache_info() == (0, 0, 2, 0, 0)
+    assert docopt.Parser("Usage: prog").cache_info() == (0, 0, 0, 0, 0)
+    records = docopt.Parser(_example_grammar(), cache_size=2, slots=True)
+    record = records.parse("rm --force 5")
+    assert records.parse("rm --force 5") is record
+    assert type(record) is records.record_type
+    assert record.as_dict() == {**expected, "<file>": ()}
+
+
+def test_parse_cache_threads():
+    parser = docopt.Parser(
+        "Usage: prog [-v...] <x>...\n\nOptions:\n  -v  Verbose.", cache_size=4
+    )
+    argvs = [["-" + "v" * (i % 3 + 1), str(i % 6)] for i in range(600)]
+    results: list = [None] * len(argvs)
+
+    def work(start: int) -> None:
+        for i in range(start, len(argvs), 6):
+            results[i] = parser.parse(argvs[i])
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(
+        r == {"-v": i % 3 + 1, "<x>": (str(i % 6),)} for i, r in enumerate(results)
+    )
+    info = parser.cache_info()
+    assert info.hits + info.misses == len(argvs) and info.currsize == 4
+
+
+def test_parse_many():
+    doc = "Usage: prog [-h] deploy <svc> [--region=<r>] [<n>...]\n\nOptions:\n  -h"
+    parser = docopt.Parser(doc, slots=True, types={"<n>": int})
+    argvs = ["deploy a 1 2", "deploy b 3 4", "deploy c", "deploy -h --region=x d"]
+    results = parser.parse_many([*argvs, "deploy", "deploy e x"])
+    assert results[:4] == [parser.parse(argv) for argv in argvs[:3]] + [
+        (True, True, "d", "x", [])
+    ]
+    assert results[1].svc == "b" and results[1].n == [3, 4]
+    assert isinstance(results[4], DocoptExit) and "Usage:" in str(results[4])
+    assert "Invalid value for <n>: 'x'" in str(results[5])
+    parser.merge("Usage: prog undo <svc>")
+    assert parser.parse_many(["undo a"])[0].undo is True
+
+
+def test_parse_many_shared_prefixes():
+    parser = docopt.Parser("Usage: prog go [--to=<x>] [-v...] <y>...\n\nOptions:\n  -v")
+    argvs = ["go --to a -v b", "go --to a -vv c", "go --nope", "go --to", "go b"]
+    argvs += ["go --to a -v", "go --to a -v d e"]
+    results = parser.parse_many(argvs, shared_prefixes=True)
+    for argv, result in zip(argvs, results):
+        try:
+            assert result == parser.parse(argv)
+        except DocoptExit as e:
+            assert str(result) == str(e)
+    assert results[1]["<y>"] == ["c"] and results[6]["<y>"] == ["d", "e"]
+    # Options added for unknown ones while parsing the shared prefix are
+    # still known when parsing resumes after it.
+    parser = docopt.Parser("Usage: prog [<x>]")
+    argvs = ["--foo=x --foo y", "--foo=x --foo z"]
+    results = parser.parse_many(argvs, shared_prefixes=True)
+    for argv, result in zip(argvs, results):
+        with pytest.raises(DocoptExit) as exit:
+            parser.parse(argv)
+        assert str(result) == str(exit.value)
+    assert "Option(None, '--foo', 1, 'z')" in str(results[1])
+
+
+@pytest.mark.parametrize("numpy", ["numpy", None])
+def test_parse_many_columnar(numpy, monkeypatch):
+    if numpy:
+        pytest.importorskip(numpy)
+    else:
+        monkeypatch.setitem(sys.modules, "numpy", None)
+    doc = """Usage: prog (go|stop) [-v...] [--to=<x>] [--n=<n>] [--f=<f>...] [<y>...]
+
+Options:
+  -v  Verbose.
+  --to=<x>  To.
+  --n=<n>  N [type: int]
+  --f=<f>  F [type: float]
+"""
+    parser = docopt.Parser(doc)
+    argvs = ["go -vv --to a x y", "stop --n 3 --f 1.5 --f 2", "nope", "go --n x"]
+    argvs.append("stop")
+    results = parser.parse_many(argvs)
+    for shared_prefixes in [False, True]:
+        columns = parser.parse_many(argvs, shared_prefixes, columnar=True)
+        assert list(columns) == list(results[0])
+        assert [bool(e) for e in columns.errors] == [False, False, True, True, False]
+        for i, result in enumerate(results):
+            if isinstance(result, DocoptExit):
+                continue
+            for key, value in result.items():
+                assert columns[key][i] == value, (key, i)
+    assert isinstance(columns["--to"], docopt.StringColumn)
+    assert columns["--to"].buffer == "a"
+    assert isinstance(columns["--n"], docopt.NumberColumn)
+    assert isinstance(columns["--f"], docopt.ListColumn)
+    assert columns["<y>"][0] == ["x", "y"]